@@ -13,6 +13,9 @@ from app.core.db import Base, DB_URL, engine
 import app.models.books
 import app.models.job
 import app.models.kabis
+import app.models.embedding_cache
+import app.models.quality_report
+import app.models.chunk_signature
 from app.models.chat import ChatHistory
 from app.models.libtau import Library
 from app.models.user import User
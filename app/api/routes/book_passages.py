@@ -0,0 +1,59 @@
+# app/api/routes/book_passages.py
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.security import get_current_user
+from app.core.vectorstore import search_in_book
+from app.models.user import User
+
+router = APIRouter(prefix="/api", tags=["book_passages"])
+
+SEARCH_CANDIDATES = 100  # кандидатов из Qdrant на одну страницу выдачи
+
+
+def _passage_key(p: dict) -> tuple[int, str]:
+    page = p["page"] if p["page"] is not None else -1
+    return page, p["id"]
+
+
+def _encode_cursor(p: dict) -> str:
+    page, point_id = _passage_key(p)
+    return f"{page}:{point_id}"
+
+
+def _decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        page, point_id = cursor.split(":", 1)
+        return int(page), point_id
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+
+@router.get("/book_passages",
+            summary="Поиск фрагментов внутри одной книги",
+            description="Ищет только по чанкам книги (doc_id или id_book). "
+                        "Результаты идут в порядке страниц, пагинация через cursor.")
+def book_passages(query: str,
+                  doc_id: str | None = None,
+                  id_book: str | None = None,
+                  cursor: str | None = None,
+                  limit: int = Query(10, ge=1, le=50),
+                  current_user: User = Depends(get_current_user)):
+    if not doc_id and not id_book:
+        raise HTTPException(400, "doc_id or id_book is required")
+
+    # курсор уходит в запрос (metadata.page >= страницы курсора): каждая страница выдачи —
+    # до SEARCH_CANDIDATES лучших чанков дальше по книге, а не срез одного top-100
+    after = _decode_cursor(cursor) if cursor else None
+    page_from = after[0] if after and after[0] >= 0 else None
+    candidates = search_in_book(query, doc_id=doc_id, id_book=id_book,
+                                limit=SEARCH_CANDIDATES, page_from=page_from)
+    truncated = len(candidates) >= SEARCH_CANDIDATES
+    passages = [p for p in candidates if _passage_key(p) > after] if after else candidates
+
+    items = passages[:limit]
+    has_more = len(passages) > limit or (truncated and bool(items))
+    next_cursor = _encode_cursor(items[-1]) if has_more else None
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+    }
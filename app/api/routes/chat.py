@@ -16,6 +16,7 @@ from app.models.libtau import Library
 import time
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core.chunking import page_label
 from sshtunnel import SSHTunnelForwarder
 import mysql.connector
 
@@ -104,7 +105,7 @@ def _format_docs(docs, per_chunk_chars=800, max_chunks=5):
         title = m.get("title", "книга")
         # author = m.get("author", "неизвестен")
         # subject = m.get("subject")
-        page = m.get("page", "?")
+        page = page_label(m)  # чанк может захватывать несколько страниц: "12–13"
         text = (d.page_content or "")[:per_chunk_chars].strip()
         lines.append(f"[{title}, стр. {page}] {text}")
         print(title, m.get("source"), text)
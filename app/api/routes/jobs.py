@@ -1,26 +1,197 @@
 # app/api/routes/jobs.py
-from fastapi import APIRouter, HTTPException
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, tuple_
 from app.core.db import SessionLocal
-from app.models.job import Job
+from app.core.progress import JOB_STEPS, get_progress_state, stream_job_events
+from app.models.job import Job, JobStatus
 
 router = APIRouter(prefix="/api", tags=["jobs"])
 
 
-@router.get("/jobs/{job_id}")
-def get_job(job_id: str):
-    db = SessionLocal()
-    job = db.get(Job, job_id)
-    db.close()
-    if not job:
-        raise HTTPException(404, "Job not found")
+def job_to_dict(job: Job) -> dict:
     return {
         "id": job.id,
         "document_id": job.document_id,
+        "batch_id": job.batch_id,
         "status": job.status,
         "step": job.current_step,
         "progress": job.progress_pct,
+        "pages_total": job.pages_total,
+        "pages_done": job.pages_done,
+        "chunks_done": job.chunks_done,
+        "step_durations": job.step_durations,
         "error": job.error_message,
         "queued_at": job.queued_at,
         "started_at": job.started_at,
         "finished_at": job.finished_at,
     }
+
+
+# поля живого состояния в Redis (JobReporter) → поля ответа job_to_dict
+LIVE_FIELDS = {
+    "status": "status",
+    "current_step": "step",
+    "progress_pct": "progress",
+    "pages_total": "pages_total",
+    "pages_done": "pages_done",
+    "chunks_done": "chunks_done",
+    "step_durations": "step_durations",
+    "error_message": "error",
+    "started_at": "started_at",
+    "finished_at": "finished_at",
+}
+
+
+def load_job_state(job_id: str) -> dict | None:
+    """Строка job в БД, поверх — живое состояние из Redis (пишет воркер чаще, чем БД)."""
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        state = job_to_dict(job) if job else None
+    live = get_progress_state(job_id)
+    if live is None:
+        return state
+    state = state or {"id": job_id}
+    state.update({field: live[key] for key, field in LIVE_FIELDS.items() if key in live})
+    return state
+
+
+STATS_WINDOWS = {"1h": timedelta(hours=1), "24h": timedelta(days=1), "7d": timedelta(days=7)}
+
+
+STATS_DEFAULT_WINDOW = timedelta(days=7)  # p50/p95 без since — только недавние job (индекс по finished_at)
+
+
+def _encode_cursor(job: Job) -> str:
+    # непрозрачный и URL-safe: '+00:00' в query без кодирования превращается в пробел
+    raw = f"{job.queued_at.isoformat()}|{job.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, job_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), job_id
+    except (ValueError, binascii.Error):
+        raise HTTPException(400, "Invalid cursor")
+
+
+@router.get("/jobs", summary="Список job (keyset-пагинация)")
+def list_jobs(status: JobStatus | None = None,
+              batch_id: str | None = None,
+              queued_from: datetime | None = None,
+              queued_to: datetime | None = None,
+              cursor: str | None = None,
+              limit: int = Query(50, ge=1, le=500)):
+    stmt = select(Job).order_by(Job.queued_at.desc(), Job.id.desc()).limit(limit + 1)
+    if status is not None:
+        stmt = stmt.where(Job.status == status)
+    if batch_id is not None:
+        stmt = stmt.where(Job.batch_id == batch_id)
+    if queued_from is not None:
+        stmt = stmt.where(Job.queued_at >= queued_from)
+    if queued_to is not None:
+        stmt = stmt.where(Job.queued_at < queued_to)
+    if cursor:
+        stmt = stmt.where(tuple_(Job.queued_at, Job.id) < _decode_cursor(cursor))
+
+    with SessionLocal() as db:
+        jobs = db.scalars(stmt).all()
+
+    items = jobs[:limit]
+    return {
+        "items": [job_to_dict(j) for j in items],
+        "next_cursor": _encode_cursor(items[-1]) if len(jobs) > limit else None,
+    }
+
+
+@router.get("/jobs/stats", summary="Статистика индексации")
+def jobs_stats(since: datetime | None = None):
+    """
+    Количество job по статусам, p50/p95 длительности (всего и по шагам)
+    и пропускная способность (страниц/чанков в секунду) за окна 1h/24h/7d.
+    p50/p95 считаются по job, завершённым с since (по умолчанию — за STATS_DEFAULT_WINDOW).
+    """
+    now = datetime.now(timezone.utc)
+    finished_from = since if since is not None else now - STATS_DEFAULT_WINDOW
+    duration = func.extract("epoch", Job.finished_at - Job.started_at)
+    # job, поставленный после since, и завершён после него — условие по finished_at берёт индекс
+    finished = [Job.status == JobStatus.succeeded, Job.started_at.isnot(None), Job.finished_at >= finished_from]
+    if since is not None:
+        finished.append(Job.queued_at >= since)
+
+    with SessionLocal() as db:
+        counts_stmt = select(Job.status, func.count()).group_by(Job.status)
+        if since is not None:
+            counts_stmt = counts_stmt.where(Job.queued_at >= since)
+        counts = {status.value: n for status, n in db.execute(counts_stmt).all()}
+
+        percentile_cols = [
+            func.percentile_cont(0.5).within_group(duration),
+            func.percentile_cont(0.95).within_group(duration),
+        ]
+        for step in JOB_STEPS:
+            step_value = Job.step_durations[step].as_float()
+            percentile_cols += [
+                func.percentile_cont(0.5).within_group(step_value),
+                func.percentile_cont(0.95).within_group(step_value),
+            ]
+        row = db.execute(select(*percentile_cols).where(*finished)).one()
+
+        throughput = {}
+        for name, delta in STATS_WINDOWS.items():
+            jobs_n, pages, chunks = db.execute(
+                select(func.count(), func.coalesce(func.sum(Job.pages_done), 0), func.coalesce(func.sum(Job.chunks_done), 0))
+                .where(Job.status == JobStatus.succeeded, Job.finished_at >= now - delta)
+            ).one()
+            seconds = delta.total_seconds()
+            throughput[name] = {
+                "jobs": jobs_n,
+                "pages": pages,
+                "chunks": chunks,
+                "pages_per_sec": round(pages / seconds, 4),
+                "chunks_per_sec": round(chunks / seconds, 4),
+            }
+
+    durations = {"total": {"p50": row[0], "p95": row[1]}}
+    for i, step in enumerate(JOB_STEPS):
+        durations[step] = {"p50": row[2 + 2 * i], "p95": row[3 + 2 * i]}
+
+    return {
+        "counts": counts,
+        "duration_seconds": durations,
+        "durations_since": finished_from,
+        "throughput": throughput,
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    state = load_job_state(job_id)
+    if not state:
+        raise HTTPException(404, "Job not found")
+    return state
+
+
+@router.get("/jobs/{job_id}/events",
+            summary="Прогресс job (Server-Sent Events)",
+            description="Стрим событий прогресса из Redis pub/sub вместо опроса /api/jobs/{job_id}.")
+def job_events(job_id: str):
+    if not load_job_state(job_id):
+        raise HTTPException(404, "Job not found")
+
+    headers = {
+        "Cache-Control": "no-cache, no-transform",
+        "X-Accel-Buffering": "no",  # для nginx
+        "Connection": "keep-alive",
+    }
+    return StreamingResponse(
+        stream_job_events(job_id, lambda: load_job_state(job_id) or {}),
+        media_type="text/event-stream",
+        headers=headers,
+    )
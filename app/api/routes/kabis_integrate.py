@@ -1,20 +1,14 @@
-from fastapi import APIRouter
-from fastapi import BackgroundTasks
-from sqlalchemy import select
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import select, func, update
 
-from app.core.book_quality_check import check_file
 from app.core.db import SessionLocal
-from app.models.kabis import Kabis
+from app.core.progress import crawl_start, crawl_set, get_crawl_state
 
 from app.models.job import Job, JobStatus
 
-from app.models.books import Document
-from app.worker import ingest_job
+from app.worker import enqueue_title_jobs, index_titles_batch, enqueue_kabis_crawl
 
 import uuid
-import os
-import requests
-from pathlib import Path
 
 
 router = APIRouter(prefix="/api", tags=["index_kabis_books", "index_kabis_file_books"])
@@ -25,93 +19,67 @@ router = APIRouter(prefix="/api", tags=["index_kabis_books", "index_kabis_file_b
             description="Index titles from library information resources"
             )
 async def kabis_index():
-    with SessionLocal() as session:
-        stmt = select(Kabis).where(Kabis.is_indexed==False)
-        rows = session.scalars(stmt).all()
-        for row in rows:
-            row_dict = {k: v for k, v in row.__dict__.items() if not k.startswith("_")}
-            document_id = str(uuid.uuid4())
+    # job создаются и ставятся в очередь в воркере пачками — endpoint отвечает сразу
+    batch_id = str(uuid.uuid4())
+    enqueue_title_jobs.send(batch_id)
+    return {"message": "Index is started", "batch_id": batch_id}
 
-            db = SessionLocal()
 
-            job = Job(document_id=document_id, status=JobStatus.queued)
-            db.add(job)
-            db.commit()
-            db.refresh(job)
-            db.close()
+@router.get("/index_kabis_titles",
+            summary="Bulk index of catalog titles",
+            description="Один job: заглавия каталога индексируются страницами по несколько сотен")
+async def kabis_index_titles():
+    with SessionLocal() as session:
+        job = Job(document_id="kabis_titles", status=JobStatus.queued)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
 
-            ingest_job.send(job.id, meta=row_dict)
-            db.commit()
-    return {"message": f"Index is stated", "queued_jobs": len(rows)}
+    index_titles_batch.send(job.id)
+    return {"status": "queued", "job_id": job.id}
 
 
 @router.get("/index_kabis_file_books",
             summary="Индексирование KABIS",
-            description="Запускает процесс индексирования файлов KABIS в фоне")
-async def index_kabis_file_books(background_tasks: BackgroundTasks):
-    background_tasks.add_task(process_kabis_files)
-    return {"status": "started", "message": "Индексирование запущено в фоне"}
+            description="Запускает обход файлов KABIS в воркерах: по одному сообщению на книгу")
+async def index_kabis_file_books():
+    # скачивание, проверка и индексация идут в dramatiq, а не в процессе uvicorn
+    batch_id = str(uuid.uuid4())
+    crawl_start(batch_id, "kabis")
+    enqueue_kabis_crawl.send(batch_id)
+    return {"status": "started", "message": "Индексирование запущено в фоне", "batch_id": batch_id}
 
 
-def process_kabis_files():
-    path_url = 'https://kabis.tau-edu.kz'
-    save_dir = Path('uploads')
-    save_dir.mkdir(exist_ok=True)
+@router.get("/index_kabis_file_books/{batch_id}", summary="Сводка обхода файлов KABIS")
+def kabis_crawl_status(batch_id: str):
+    crawl = get_crawl_state(batch_id)
+    if crawl is None:
+        raise HTTPException(404, "Crawl not found")
 
     with SessionLocal() as session:
-        stmt = (
-            select(Kabis)
-            .where(
-                Kabis.file_is_index.is_(False),
-                Kabis.download_url.isnot(None)
-            )
-        )
-        rows = session.scalars(stmt).all()
-
-        for row in rows:
-            url = f"{path_url}{row.download_url}"
-            filename = os.path.basename(row.download_url)
-            save_path = save_dir / filename
-
-            try:
-                resp = requests.get(url, timeout=30)
-                resp.raise_for_status()
-            except requests.RequestException:
-                continue
-
-            with open(save_path, "wb") as f:
-                f.write(resp.content)
-
-            book_quality = check_file(save_path)
-            if book_quality["verdict"] not in ("OK_TEXT", "OK_TEXT_PDF", "OK_OCR"):
-                continue
-
-            doc = Document(
-                title=row.title or row.author,
-                file_path=str(save_path),
-                file_type=filename.split(".")[-1].lower(),
-                id_book=row.id,
-                source="kabis"
-            )
-            session.add(doc)
-            session.commit()
-            session.refresh(doc)
-
-            job = Job(
-                document_id=doc.id,
-                status=JobStatus.queued
-            )
-
-            session.add(job)
-            session.commit()
-            session.refresh(job)
-
-            ingest_job(job.id, str(filename), meta={
-                "id_book": row.id_book,
-                "title_book": row.title or row.author,
-                "doc_id": doc.id,
-                "source_data": "kabis",
-            })
-
-            row.file_is_index = True
-            session.commit()
+        jobs = dict(session.execute(
+            select(Job.status, func.count()).where(Job.batch_id == batch_id).group_by(Job.status)
+        ).all())
+    return {
+        "batch_id": batch_id,
+        **crawl,
+        "jobs": {status.value: n for status, n in jobs.items()},
+    }
+
+
+@router.post("/index_kabis_file_books/{batch_id}/cancel", summary="Отмена обхода файлов KABIS")
+def kabis_crawl_cancel(batch_id: str):
+    if get_crawl_state(batch_id) is None:
+        raise HTTPException(404, "Crawl not found")
+
+    # новые книги не ставятся и не качаются, ждущие в очереди job не запускаются;
+    # уже идущая индексация книги доводится до конца
+    crawl_set(batch_id, status="canceled")
+    with SessionLocal() as session:
+        canceled = session.execute(
+            update(Job)
+            .where(Job.batch_id == batch_id, Job.status == JobStatus.queued)
+            .values(status=JobStatus.canceled)
+        ).rowcount
+        session.commit()
+    return {"status": "canceled", "batch_id": batch_id, "jobs_canceled": canceled}
@@ -1,47 +1,95 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from kabisapi.main import get_token, api_get
+import json
+import uuid
+
+from kabisapi.main import get_token, api_get, iter_books_pages
 from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
 from app.models.kabis import Kabis
-from kabisapi.read_kabis import parse_payload, flatten_copies
+from kabisapi.read_kabis import parse_payload, parse_pool, flatten_copies
 from app.core.config import settings
 from app.core.db import SessionLocal
+from app.core.progress import redis_client
 
 from sqlalchemy.orm import Session
 
 router = APIRouter(prefix="/api", tags=["upload_kabis"])
 
 
-def save_kabis_rows(session: Session, rows: list[dict]):
+UPSERT_BATCH_SIZE = 1000  # строк на один INSERT ... ON CONFLICT (≈20 параметров на строку)
+
+# поля каталога, которые обновляются при повторной выгрузке; флаги индексации и файлы не трогаем
+CATALOG_FIELDS = (
+    "position", "bbk_top", "bbk_tail", "bbk", "dept_code", "lang", "sigla", "author", "title",
+    "pub_info", "year", "isbn", "subjects", "download_url", "open_url", "copy_location", "ab",
+)
+
+
+def kabis_row_values(row: dict, idbk: str) -> dict:
+    return {
+        "position": str(row.get("pos") or ""),
+        "id_book": idbk,
+        "bbk_top": row.get("bbk_top"),
+        "bbk_tail": row.get("bbk_tail"),
+        "bbk": row.get("bbk_top") or row.get("bbk_tail"),
+        "dept_code": row.get("dept_code"),
+        "lang": row.get("lang"),
+        "sigla": row.get("sigla"),
+        "author": row.get("author"),
+        "title": row.get("title"),
+        "pub_info": row.get("pub_info"),
+        "year": row.get("year"),
+        "isbn": row.get("isbn"),
+        "subjects": row.get("subjects"),
+        "download_url": row.get("download_url"),
+        "open_url": row.get("open_url"),
+        "copy_location": str(row.get("copy_location") or ""),
+        "ab": row.get("copy_count"),
+    }
+
+
+def save_kabis_rows(session: Session, rows: list[dict]) -> int:
+    """
+    Пакетный upsert карточек: INSERT ... ON CONFLICT (id_book) DO UPDATE
+    по UPSERT_BATCH_SIZE строк. Из нескольких строк одной книги (flatten_copies —
+    по строке на место хранения) берётся первая, как и раньше.
+    Возвращает количество записанных книг.
+    """
+    values = {}
     for row in rows:
-        idbk = (str(row.get("idbk")) or "").strip()
-        if not idbk:
-            continue
-        exists = session.scalar(select(Kabis.id_book).where(Kabis.id_book == idbk))
-        if exists:
-            continue
-        session.add(Kabis(
-            position=str(row.get("pos") or ""),
-            id_book=idbk,
-            bbk_top=row.get("bbk_top"),
-            bbk_tail=row.get("bbk_tail"),
-            bbk=row.get("bbk_top") or row.get("bbk_tail"),
-            dept_code=row.get("dept_code"),
-            lang=row.get("lang"),
-            sigla=row.get("sigla"),
-            author=row.get("author"),
-            title=row.get("title"),
-            pub_info=row.get("pub_info"),
-            year=row.get("year"),
-            isbn=row.get("isbn"),
-            subjects=row.get("subjects"),
-            download_url=row.get("download_url"),
-            open_url=row.get("open_url"),
-            copy_location=str(row.get("copy_location") or ""),
-            ab=row.get("copy_count"),
-        ))
-        session.flush()
+        idbk = str(row.get("idbk") or "").strip()
+        if idbk and idbk not in values:
+            values[idbk] = kabis_row_values(row, idbk)
+    values = list(values.values())
+
+    for i in range(0, len(values), UPSERT_BATCH_SIZE):
+        stmt = insert(Kabis).values([
+            {"id": str(uuid.uuid4()), **v} for v in values[i:i + UPSERT_BATCH_SIZE]
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Kabis.id_book],
+            set_={field: stmt.excluded[field] for field in CATALOG_FIELDS},
+        )
+        session.execute(stmt)
     session.commit()
+    return len(values)
+
+
+SYNC_CURSOR_KEY = "kabis:sync:cursor"
+
+
+def load_sync_cursor(end_pos: int) -> int | None:
+    """Следующая позиция прерванной выгрузки того же диапазона (None — начинаем заново)."""
+    raw = redis_client.get(SYNC_CURSOR_KEY)
+    if not raw:
+        return None
+    cursor = json.loads(raw)
+    return cursor["next_pos"] if cursor.get("end_pos") == end_pos else None
+
+
+def save_sync_cursor(next_pos: int, end_pos: int):
+    redis_client.set(SYNC_CURSOR_KEY, json.dumps({"next_pos": next_pos, "end_pos": end_pos}))
 
 
 # kabis_service.py
@@ -49,6 +97,10 @@ def sync_kabis_upload():
     """
     Синхронизация локальной базы Kabis с удалённым источником.
     Загружает только новые книги, если их количество увеличилось.
+    Каталог выгружается страницами по KABIS_SYNC_PAGE_SIZE (до KABIS_SYNC_CONCURRENCY
+    запросов параллельно), каждая страница разбирается и сохраняется сразу,
+    после неё в Redis пишется курсор — упавшая выгрузка продолжится с него.
+    Карточки разбираются в пуле из KABIS_PARSE_WORKERS процессов (один на всю выгрузку).
     """
     token = get_token(settings.KABIS_USERNAME, settings.KABIS_PASSWORD)
 
@@ -72,20 +124,12 @@ def sync_kabis_upload():
         # --- Если локальная база пуста (первая загрузка) ---
         if local_count == 0:
             print("[INFO] Первая загрузка данных с KABIS...")
-            json_kabis = api_get(
-                "/get_books_range",
-                token,
-                params={"start_pos": 1, "end_pos": kabis_count}
-            ).json()
+            start_pos = 1
 
         # --- Если появились новые книги ---
         elif local_count < kabis_count:
             print(f"[INFO] Обнаружены новые книги: {kabis_count - local_count} шт.")
-            json_kabis = api_get(
-                "/get_books_range",
-                token,
-                params={"start_pos": int(local_count), "end_pos": int(kabis_count)}
-            ).json()
+            start_pos = int(local_count)
 
         else:
             # Это на случай, если почему-то локальных книг больше (ошибка данных)
@@ -97,15 +141,31 @@ def sync_kabis_upload():
                 "kabis_count": kabis_count,
             }
 
-        # --- Сохраняем новые данные ---
-        rows = parse_payload(json_kabis)
-        rows_flat = flatten_copies(rows)
-        save_kabis_rows(session, rows_flat)
-
-        print(f"[INFO] Успешно добавлено {len(rows_flat)} записей в базу.")
+        end_pos = int(kabis_count)
+        resume_pos = load_sync_cursor(end_pos)
+        if resume_pos is not None and resume_pos > start_pos:
+            print(f"[INFO] Продолжаем прерванную выгрузку с позиции {resume_pos}")
+            start_pos = resume_pos
+
+        # --- Сохраняем новые данные постранично ---
+        added = 0
+        with parse_pool(settings.KABIS_PARSE_WORKERS) as pool:
+            for page_start, page_end, json_kabis in iter_books_pages(
+                    token, start_pos, end_pos,
+                    page_size=settings.KABIS_SYNC_PAGE_SIZE,
+                    concurrency=settings.KABIS_SYNC_CONCURRENCY):
+                rows = parse_payload(json_kabis, executor=pool)
+                rows_flat = flatten_copies(rows)
+                saved = save_kabis_rows(session, rows_flat)
+                save_sync_cursor(page_end + 1, end_pos)
+                added += saved
+                print(f"[INFO] KABIS {page_start}–{page_end}/{end_pos}: {saved} записей")
+
+        redis_client.delete(SYNC_CURSOR_KEY)
+        print(f"[INFO] Успешно добавлено {added} записей в базу.")
         return {
             "status": "success",
-            "added": len(rows_flat),
+            "added": added,
             "new_total": kabis_count,
         }
 
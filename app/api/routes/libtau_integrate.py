@@ -7,13 +7,11 @@ from app.core.config import settings
 from app.core.db import SessionLocal
 
 from app.models.libtau import Library
-from app.models.books import Document
-from app.models.job import Job, JobStatus
 
-from app.core.book_quality_check import check_file
-from app.worker import ingest_job
+from app.core.downloader import DownloadResult, download_files
+from app.core.fingerprint import file_sha256
+from app.worker import queue_catalog_file
 
-import uuid
 import time
 from pathlib import Path
 import os
@@ -69,58 +67,47 @@ async def lib_tau_get_count_books():
     }
 
 
-def process_library_row(row_id: int):
-    with SessionLocal() as session:
-        row = session.get(Library, row_id)
-        if not row or row.file_is_indexed:
-            return
+def library_save_path(row: Library) -> Path:
+    return Path("uploads") / os.path.basename(row.download_url)
 
-        download_url = row.download_url
-        filename = os.path.basename(download_url)
-        save_path = Path("uploads") / filename
 
-        try:
-            resp = requests.get(download_url, timeout=30)
-            resp.raise_for_status()
-        except requests.RequestException:
-            return
+def process_library_rows(row_ids: list):
+    """Качает файлы пачками параллельно (потоково на диск), затем обрабатывает каждый."""
+    with SessionLocal() as session:
+        rows = session.scalars(select(Library).where(Library.id.in_(row_ids))).all()
+        items = [(row.id, row.download_url, library_save_path(row)) for row in rows]
 
-        with open(save_path, "wb") as f:
-            f.write(resp.content)
+    step = settings.DOWNLOAD_CONCURRENCY * 4
+    for i in range(0, len(items), step):
+        batch = items[i:i + step]
+        results = download_files([(url, path) for _, url, path in batch])
+        for (row_id, _, _), result in zip(batch, results):
+            if result.ok:
+                process_library_row(row_id, result)
 
-        book_quality = check_file(save_path)
-        if book_quality["verdict"] not in ("OK_TEXT", "OK_TEXT_PDF", "OK_OCR"):
-            return
 
-        doc = Document(
-            title=row.title,
-            file_path=str(save_path),
-            file_type=filename.split(".")[-1].lower(),
-            id_book=row.id,
-            source="library"
-        )
-        session.add(doc)
-        session.commit()
-        session.refresh(doc)
+def process_library_row(row_id: int, result: DownloadResult | None = None):
+    with SessionLocal() as session:
+        row = session.get(Library, row_id)
+        if not row or row.file_is_indexed:
+            return
 
-        job = Job(document_id=str(uuid.uuid4()), status=JobStatus.queued)
-        session.add(job)
-        session.commit()
+        if result is None:
+            result = download_files([(row.download_url, library_save_path(row))])[0]
+            if not result.ok:
+                return
 
-        ingest_job.send(
-            job.id,
-            str(filename),
-            meta={
-                "id_book": row.id,
-                "title_book": row.title,
-                "Library": True,
-                "doc_id": doc.id,
-                "source_data": "libtau"
-            }
+        save_path = result.path
+        outcome = queue_catalog_file(
+            session, save_path, result.sha256 or file_sha256(save_path),
+            source="library",
+            id_book=row.id,
+            title=row.title,
+            meta={"id_book": row.id, "title_book": row.title, "Library": True, "source_data": "libtau"},
         )
-
-        row.file_is_indexed = True
-        session.commit()
+        if outcome in ("duplicate", "downloaded"):
+            row.file_is_indexed = True
+            session.commit()
 
 
 @router.get("/index_library_file_books", summary="Index file books from Library information resource lib.tau-edu.kz")
@@ -138,7 +125,6 @@ async def index_library_file_books(background_tasks: BackgroundTasks):
         )
         rows = session.scalars(stmt).all()
 
-    for row in rows:
-        background_tasks.add_task(process_library_row, row.id)
+    background_tasks.add_task(process_library_rows, [row.id for row in rows])
 
     return {"queued": len(rows)}
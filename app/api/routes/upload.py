@@ -1,26 +1,44 @@
-from fastapi import APIRouter, UploadFile
+from fastapi import APIRouter, UploadFile, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+import hashlib
+import json
 import uuid
+from pathlib import Path
 from ...core.config import settings
 from app.core.db import SessionLocal
 from app.models.job import Job, JobStatus
 from app.models.books import Document
-from app.worker import ingest_job  # импорт актёра
-from app.core.book_quality_check import check_file
+from app.worker import ingest_upload  # импорт актёра
+from app.core.quality_reports import checked_file_async, is_accepted
+from app.core.fingerprint import file_sha256, find_canonical_document, attach_duplicate
 
 
 router = APIRouter(prefix="/api", tags=["upload"])
 files_db: dict[str, dict] = {}
 
+PARTIAL_DIR = settings.UPLOAD_DIR / ".partial"  # незавершённые загрузки по кускам
 
-@router.post("/upload", summary="Загрузить файл",
-             description="Поддерживаются PDF, TXT, DOCX, EPUB. Файл сохраняется в папке `uploads`.")
-async def upload(file: UploadFile):
 
-    save_path = settings.UPLOAD_DIR / file.filename
-    with open(save_path, "wb") as f:
-        f.write(await file.read())
-    book_quality = check_file(save_path)
-    if book_quality["verdict"] in ("OK_TEXT", "OK_TEXT_PDF", "OK_OCR"):
+async def register_upload(save_path: Path, filename: str, sha256: str) -> dict:
+    """Файл уже на диске: дедупликация по хэшу → проверка качества → Document + job → очередь."""
+
+    # такой файл уже загружен/проиндексирован → не парсим и не эмбеддим заново
+    with SessionLocal() as session:
+        original = find_canonical_document(session, sha256)
+        if original is not None:
+            doc = attach_duplicate(
+                session, original,
+                title=filename,
+                file_path=str(save_path),
+                file_type=filename.split(".")[-1].lower(),
+            )
+            return {"document_id": doc.id, "canonical_document_id": original.id, "status": "duplicate"}
+
+    # сохранённый отчёт по хэшу, иначе fitz/langdetect в пуле процессов —
+    # event loop продолжает обслуживать запросы
+    with SessionLocal() as session:
+        book_quality = await checked_file_async(session, save_path, sha256)
+    if is_accepted(book_quality):
         print("✅ Документ читаемый, можно индексировать")
     else:
         return {"status": "error, document not readable"}
@@ -32,9 +50,10 @@ async def upload(file: UploadFile):
     db_doc = SessionLocal()
 
     doc = Document(
-        title=file.filename,
+        title=filename,
         file_path=str(save_path),
-        file_type=file.filename.split(".")[-1].lower(),
+        file_type=filename.split(".")[-1].lower(),
+        content_sha256=sha256,
     )
 
     db_doc.add(doc)
@@ -49,14 +68,106 @@ async def upload(file: UploadFile):
     db.refresh(job)
     db.close()
 
-    # 4) поставить в очередь
-    ingest_job.send(job.id, str(file.filename))
-    doc.is_indexed = True
-    db.commit()
+    # 4) поставить в очередь; is_indexed выставит воркер по doc_id после индексации
+    ingest_upload.send(job.id, str(filename), meta={"doc_id": doc.id})
 
     # Закрыть
     db_doc.refresh(doc)
     db_doc.close()
     db_doc.commit()
     # 5) ответить клиенту
-    return {"document_id": document_id, "job_id": job.id, "status": "queued"}
\ No newline at end of file
+    return {"document_id": document_id, "job_id": job.id, "status": "queued"}
+
+
+@router.post("/upload", summary="Загрузить файл",
+             description="Поддерживаются PDF, TXT, DOCX, EPUB. Файл сохраняется в папке `uploads`.")
+async def upload(file: UploadFile):
+
+    # пишем кусками и считаем SHA-256 на лету — книга целиком в память не попадает
+    save_path = settings.UPLOAD_DIR / file.filename
+    h = hashlib.sha256()
+    size = 0
+    with open(save_path, "wb") as f:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.UPLOAD_MAX_BYTES:
+                f.close()
+                save_path.unlink(missing_ok=True)
+                raise HTTPException(413, "File too large")
+            h.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+
+    return await register_upload(save_path, file.filename, h.hexdigest())
+
+
+# === Загрузка по кускам с продолжением (книги 200 МБ+) ===
+#   POST /api/uploads                   {filename, size} → upload_id
+#   PUT  /api/uploads/{id}?offset=N     тело запроса — следующий кусок файла
+#   GET  /api/uploads/{id}              сколько байт уже принято (с чего продолжать)
+#   POST /api/uploads/{id}/complete     файл собран → та же обработка, что у /api/upload
+
+def _partial_paths(upload_id: str) -> tuple[Path, Path]:
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        raise HTTPException(404, "Upload not found")
+    return PARTIAL_DIR / f"{upload_id}.part", PARTIAL_DIR / f"{upload_id}.json"
+
+
+def _load_upload(upload_id: str) -> tuple[Path, dict]:
+    part, meta_path = _partial_paths(upload_id)
+    if not meta_path.exists():
+        raise HTTPException(404, "Upload not found")
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta["received"] = part.stat().st_size if part.exists() else 0
+    return part, meta
+
+
+@router.post("/uploads", summary="Начать загрузку по кускам")
+def create_upload(filename: str, size: int | None = None):
+    if size is not None and size > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(413, "File too large")
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    part, meta_path = _partial_paths(upload_id)
+    part.touch()
+    meta_path.write_text(json.dumps({"filename": Path(filename).name, "size": size}), encoding="utf-8")
+    return {"upload_id": upload_id, "received": 0, "chunk_size": settings.UPLOAD_CHUNK_SIZE}
+
+
+@router.get("/uploads/{upload_id}", summary="Состояние загрузки по кускам")
+def get_upload(upload_id: str):
+    _, meta = _load_upload(upload_id)
+    return {"upload_id": upload_id, **meta}
+
+
+@router.put("/uploads/{upload_id}", summary="Дописать кусок файла")
+async def put_upload_chunk(upload_id: str, offset: int, request: Request):
+    part, meta = _load_upload(upload_id)
+    if offset != meta["received"]:
+        # кусок потерялся или пришёл повторно — клиент продолжает с received
+        raise HTTPException(409, {"message": "Offset mismatch", "received": meta["received"]})
+
+    received = offset
+    with open(part, "ab") as f:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > settings.UPLOAD_MAX_BYTES:
+                f.truncate(offset)
+                raise HTTPException(413, "File too large")
+            await run_in_threadpool(f.write, chunk)
+    return {"upload_id": upload_id, "received": received}
+
+
+@router.post("/uploads/{upload_id}/complete", summary="Завершить загрузку по кускам")
+async def complete_upload(upload_id: str):
+    part, meta = _load_upload(upload_id)
+    if meta["size"] is not None and meta["received"] != meta["size"]:
+        raise HTTPException(409, {"message": "Upload incomplete", "received": meta["received"]})
+
+    save_path = settings.UPLOAD_DIR / meta["filename"]
+    sha256 = await run_in_threadpool(file_sha256, part)
+    part.replace(save_path)
+    _partial_paths(upload_id)[1].unlink(missing_ok=True)
+
+    return await register_upload(save_path, meta["filename"], sha256)
@@ -1,4 +1,7 @@
+import asyncio
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import List, Optional
 import re
@@ -7,55 +10,28 @@ import charset_normalizer as chn
 from langdetect import detect, DetectorFactory
 from ftfy import fix_text
 
-import fitz
 import pytesseract
 
 from docx import Document as DocxDocument
 from ebooklib import epub
 from app.core.config import settings
+from app.core.pdf_analysis import PDFAnalysis, analyze_pdf, ensure_analysis, scanned_from_analysis
 
 
+import heapq
 import math
 from collections import Counter
 
+import numpy as np
+
 DetectorFactory.seed = 0
+CHECKER_VERSION = "2"  # менять при изменении порогов/вердиктов — сохранённые отчёты (quality_reports) устареют
 pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
 
 
 def is_scanned_pdf(path: str, min_text_per_page: int = 300, min_text_fraction: float = 0.3) -> bool:
     """Определяет, что PDF — скан (а не текстовый), без OCR."""
-    try:
-        doc = fitz.open(path)
-    except Exception:
-        return True
-
-    n_pages = doc.page_count
-    if n_pages == 0:
-        return True
-
-    pages_with_text = 0
-    total_chars = 0
-    image_pages = 0
-
-    for i in range(min(n_pages, 10)):
-        page = doc.load_page(i)
-        text = page.get_text("text")
-        total_chars += len(text)
-        if len(text.strip()) > min_text_per_page:
-            pages_with_text += 1
-        if len(page.get_images()) > 0:
-            image_pages += 1
-
-    avg_chars = total_chars / max(1, min(n_pages, 10))
-    text_fraction = pages_with_text / max(1, min(n_pages, 10))
-
-    if text_fraction < min_text_fraction and image_pages > pages_with_text:
-        return True
-
-    if avg_chars < 200 and text_fraction < 0.4:
-        return True
-
-    return False
+    return scanned_from_analysis(analyze_pdf(path), min_text_per_page, min_text_fraction)
 
 
 def text_entropy(text: str) -> float:
@@ -121,10 +97,116 @@ def basic_text_metrics(text: str) -> dict:
     }
 
 
-def text_is_readable(metrics: dict, text: str) -> bool:
-    rep_score = text_repetition_score(text)
-    line_div = line_diversity_score(text)
-    dom_ratio = dominant_word_ratio(text)
+SAMPLE_WINDOWS = 64
+
+
+def sample_text(text: str, sample_chars: int, windows: int = SAMPLE_WINDOWS) -> str:
+    """Равномерная выборка ~sample_chars символов окнами по границам строк."""
+    width = max(1, sample_chars // windows)
+    step = len(text) // windows
+    parts = []
+    for i in range(windows):
+        start = i * step
+        if start:
+            nl = text.find("\n", start, start + width)
+            start = nl + 1 if nl != -1 else start
+        end = start + width
+        nl = text.rfind("\n", start, end)
+        parts.append(text[start:nl if nl > start else end])
+    return "\n".join(parts)
+
+
+def text_quality_metrics(text: str, sample_chars: int | None = None, detect_lang: bool = True) -> dict:
+    """
+    Все метрики качества текста за один проход (то же, что basic_text_metrics,
+    text_entropy, text_repetition_score, line_diversity_score, dominant_word_ratio):
+    символьные — NumPy по массиву кодовых точек, классы символов считаются один раз
+    на уникальный символ; словные — один Counter по словам.
+    sample_chars: если текст длиннее, метрики считаются по равномерной выборке
+    (len остаётся полной длиной).
+    """
+    if not text:
+        return {
+            **basic_text_metrics(""),
+            "entropy": 0.0, "repetition_score": 1.0, "line_diversity": 1.0, "dominant_word_ratio": 1.0,
+            "sampled": False,
+        }
+
+    full_len = len(text)
+    sampled = bool(sample_chars) and full_len > sample_chars
+    if sampled:
+        text = sample_text(text, sample_chars)
+    n = len(text)
+
+    # --- символьные метрики: гистограмма кодовых точек ---
+    cps = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    uniq, inverse, counts = np.unique(cps, return_inverse=True, return_counts=True)
+    chars = [chr(c) for c in uniq.tolist()]
+    printable = np.fromiter((c.isprintable() for c in chars), bool, len(chars))
+    alnum = np.fromiter((c.isalnum() for c in chars), bool, len(chars))
+    space = np.fromiter((c.isspace() for c in chars), bool, len(chars))
+    ctrl = (uniq < 32) & ~np.isin(uniq, (9, 10, 13))
+
+    # токены str.split(): непробельные символы и начала непробельных серий
+    nonspace = ~space[inverse]
+    n_tokens = int(np.count_nonzero(nonspace[1:] & ~nonspace[:-1]) + nonspace[0])
+    token_chars = int(np.count_nonzero(nonspace))
+
+    # энтропия по text.lower() (lower() не посимвольный: İ, финальная Σ)
+    lowered = np.frombuffer(text.lower().encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    freq = np.unique(lowered, return_counts=True)[1].astype(np.float64)
+    probs = freq / freq.sum()
+    entropy = float(-(probs * np.log2(probs)).sum())
+
+    # --- словные метрики: один Counter по словам, дальше — по уникальным словам ---
+    long_words = Counter()
+    alpha_words = Counter()
+    for w, k in Counter(text.split()).items():
+        if len(w) > 2:
+            long_words[w.lower()] += k
+        if w.isalpha():
+            alpha_words[w.lower()] += k
+    long_total = sum(long_words.values())
+    alpha_total = sum(alpha_words.values())
+    rep_score = 1 - len(long_words) / long_total if long_total else 1.0
+    dom_ratio = sum(heapq.nlargest(5, alpha_words.values())) / alpha_total if alpha_total else 1.0
+
+    lines = [l for l in (l.strip() for l in text.splitlines()) if l]
+    line_div = len(set(lines)) / len(lines) if lines else 1.0
+
+    lang = None
+    if detect_lang:
+        try:
+            lang = detect(text[: min(5000, n)])
+        except Exception:
+            lang = None
+
+    return {
+        "len": full_len,
+        "printable_ratio": int(counts[printable].sum()) / n,
+        "alnum_ratio": int(counts[alnum].sum()) / n,
+        "�_ratio": int(counts[uniq == 0xFFFD].sum()) / n,
+        "ctrl_ratio": int(counts[ctrl].sum()) / n,
+        "avg_token_len": token_chars / n_tokens if n_tokens else 0,
+        "lang": lang,
+        "entropy": entropy,
+        "repetition_score": rep_score,
+        "line_diversity": line_div,
+        "dominant_word_ratio": dom_ratio,
+        "sampled": sampled,
+    }
+
+
+def text_is_readable(metrics: dict, text: str | None = None) -> bool:
+    # метрики из text_quality_metrics уже содержат словные оценки — текст не нужен
+    if "repetition_score" in metrics:
+        rep_score = metrics["repetition_score"]
+        line_div = metrics["line_diversity"]
+        dom_ratio = metrics["dominant_word_ratio"]
+    else:
+        rep_score = text_repetition_score(text)
+        line_div = line_diversity_score(text)
+        dom_ratio = dominant_word_ratio(text)
 
     return (
         metrics["len"] >= 1000 and
@@ -179,26 +261,15 @@ class PDFTextStats:
     verdict: str
 
 
-def pdf_extract_text_stats(path: str) -> PDFTextStats:
-    doc = fitz.open(path)
-    n = doc.page_count
-    pages_with_text = 0
-    total_chars = 0
-    sample_text = []
-
-    for i in range(n):
-        page = doc.load_page(i)
-        txt = page.get_text("text") or ""
-        total_chars += len(txt)
-        if len(txt.strip()) >= 50:
-            pages_with_text += 1
-        if i < 5:
-            sample_text.append(txt)
-
-    text_sample = " ".join(sample_text)
-    rep_score = text_repetition_score(text_sample)
-    entropy = text_entropy(text_sample)
-    line_div = line_diversity_score(text_sample)
+def text_stats_from_analysis(analysis: PDFAnalysis) -> PDFTextStats:
+    n = analysis.n_pages
+    pages_with_text = sum(1 for p in analysis.pages if p.stripped_chars >= 50)
+    total_chars = analysis.total_chars
+
+    sample = text_quality_metrics(analysis.sample_text, detect_lang=False)
+    rep_score = sample["repetition_score"]
+    entropy = sample["entropy"]
+    line_div = sample["line_diversity"]
 
     if pages_with_text / max(1, n) >= 0.7 and total_chars >= 2000:
         verdict = "OK_TEXT_PDF"
@@ -218,6 +289,10 @@ def pdf_extract_text_stats(path: str) -> PDFTextStats:
     )
 
 
+def pdf_extract_text_stats(path: str) -> PDFTextStats:
+    return text_stats_from_analysis(analyze_pdf(path))
+
+
 def check_file(path: str) -> dict:
     ext = os.path.splitext(path)[1].lower()
     report = {"path": path, "ext": ext, "book_quality": "UNKNOWN"}
@@ -231,8 +306,19 @@ def check_file(path: str) -> dict:
         return report
 
     if ext == ".pdf":
+        # один проход fitz: и статистика, и постраничный текст для воркера
         try:
-            if is_scanned_pdf(path):
+            analysis = analyze_pdf(path)
+            if scanned_from_analysis(analysis):
+                if settings.OCR_ENABLED and analysis.n_pages > 0:
+                    # скан пойдёт в воркер через OCR (app.core.ocr)
+                    report.update({
+                        "type": "pdf",
+                        "pages": analysis.n_pages,
+                        "verdict": "OK_OCR",
+                        "book_quality": "NEEDS_OCR"
+                    })
+                    return report
                 report.update({
                     "type": "pdf",
                     "verdict": "LIKELY_SCANNED",
@@ -248,7 +334,7 @@ def check_file(path: str) -> dict:
             })
             return report
 
-        pdf = pdf_extract_text_stats(path)
+        pdf = text_stats_from_analysis(analysis)
         avg_chars = pdf.total_chars / max(1, pdf.n_pages)
 
         # 💡 Фильтр качества PDF
@@ -301,12 +387,12 @@ def check_file(path: str) -> dict:
         return report
 
     text = fix_text(text)
-    metrics = basic_text_metrics(text)
-    entropy = text_entropy(text)
-    rep_score = text_repetition_score(text)
-    line_div = line_diversity_score(text)
+    metrics = text_quality_metrics(text, settings.QUALITY_SAMPLE_CHARS or None)
+    entropy = metrics["entropy"]
+    rep_score = metrics["repetition_score"]
+    line_div = metrics["line_diversity"]
 
-    if text_is_readable(metrics, text) and entropy > 3.0 and rep_score < 0.6 and line_div > 0.3:
+    if text_is_readable(metrics) and entropy > 3.0 and rep_score < 0.6 and line_div > 0.3:
         verdict = "OK_TEXT"
         quality = "GOOD"
     elif entropy < 2.0 or rep_score > 0.8 or line_div < 0.2:
@@ -328,10 +414,34 @@ def check_file(path: str) -> dict:
         "entropy": round(entropy, 3),
         "repetition_score": round(rep_score, 3),
         "line_diversity": round(line_div, 3),
+        "sampled": metrics["sampled"],
         "verdict": verdict,
         "book_quality": quality
     })
     return report
 
 
+_check_pool: ProcessPoolExecutor | None = None
+
+
+async def _run_in_check_pool(fn, *args):
+    global _check_pool
+    if _check_pool is None:
+        _check_pool = ProcessPoolExecutor(max_workers=settings.QUALITY_CHECK_WORKERS,
+                                          mp_context=multiprocessing.get_context("spawn"))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_check_pool, fn, *args)
+
+
+async def check_file_async(path) -> dict:
+    """
+    check_file в отдельном процессе: разбор fitz/langdetect большой книги
+    не блокирует event loop веб-сервера.
+    """
+    return await _run_in_check_pool(check_file, str(path))
+
+
+async def ensure_analysis_async(path):
+    """Артефакт анализа PDF (текст страниц для воркера) — в том же пуле процессов."""
+    await _run_in_check_pool(ensure_analysis, str(path))
 
@@ -0,0 +1,178 @@
+# app/core/chunking.py
+# Чанкинг книги по токенам модели эмбеддингов, через границы страниц:
+# у каждого чанка — диапазон страниц page_start..page_end в metadata.
+import re
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Iterable
+
+import tiktoken
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def token_encoding(model: str | None = None) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model or settings.EMBEDDING_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")  # text-embedding-3-*, ada-002
+
+
+def page_label(metadata: dict):
+    """Страница для цитаты: "12" или "12–13", если чанк захватывает несколько страниц."""
+    start = metadata.get("page_start", metadata.get("page"))
+    end = metadata.get("page_end", start)
+    if start is None:
+        return "?"
+    return f"{start}–{end}" if end is not None and end != start else f"{start}"
+
+
+@dataclass
+class _Segment:
+    text: str
+    tokens: int
+    seq: int            # номер страницы в потоке (для чекпоинта)
+    offset: int         # смещение в тексте страницы
+    sep: str            # чем присоединять к предыдущему сегменту
+    metadata: dict
+
+
+class PageChunker:
+    """
+    Линейный проход по страницам: страница режется на абзацы (длинные — на
+    предложения, совсем длинные — на куски по символам), абзацы копятся в буфер,
+    пока он не наберёт chunk_tokens, затем буфер становится чанком. Буфер
+    переходит через границу страницы; хвост не длиннее overlap_tokens остаётся
+    перекрытием для следующего чанка. Абзацы страницы токенизируются одним
+    пакетным вызовом, текст заново не токенизируется.
+    """
+
+    def __init__(self,
+                 chunk_tokens: int | None = None,
+                 overlap_tokens: int | None = None,
+                 model: str | None = None,
+                 start_seq: int = 0):
+        self.chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.encoding = token_encoding(model)
+        self.buffer: deque[_Segment] = deque()
+        self.buffer_tokens = 0
+        self.fresh = 0      # сегментов в буфере после перекрытия
+        self.seq = start_seq
+
+    def state(self) -> dict:
+        """
+        Состояние для чекпоинта (JSON): сколько страниц подано и недобранный буфер
+        вместе с перекрытием. Продолжение с него режет книгу на те же чанки,
+        что и запуск без перерыва, — и даёт те же id точек.
+        """
+        return {
+            "seq": self.seq,
+            "buffer": [asdict(s) for s in self.buffer],
+            "buffer_tokens": self.buffer_tokens,
+            "fresh": self.fresh,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, **kwargs) -> "PageChunker":
+        chunker = cls(start_seq=state["seq"], **kwargs)
+        chunker.buffer = deque(_Segment(**s) for s in state["buffer"])
+        chunker.buffer_tokens = state["buffer_tokens"]
+        chunker.fresh = state["fresh"]
+        return chunker
+
+    def _split_long(self, text: str, offset: int, seq: int, metadata: dict) -> list[_Segment]:
+        segments = []
+        pos = 0
+        for sentence in SENTENCE_RE.split(text):
+            start = text.find(sentence, pos)
+            pos = start + len(sentence)
+            n_tokens = len(self.encoding.encode_ordinary(sentence))
+            if n_tokens <= self.chunk_tokens:
+                segments.append(_Segment(sentence, n_tokens, seq, offset + start, " ", metadata))
+                continue
+            # предложение длиннее чанка (таблица, мусорный текстовый слой) — режем по символам
+            # пропорционально токенам: декодирование окон токенов рвёт многобайтовые символы
+            width = max(1, len(sentence) * self.chunk_tokens // n_tokens)
+            for i in range(0, len(sentence), width):
+                piece = sentence[i:i + width]
+                segments.append(_Segment(piece, len(self.encoding.encode_ordinary(piece)),
+                                         seq, offset + start + i, " " if i == 0 else "", metadata))
+        return segments
+
+    def _segments(self, page: Document, seq: int) -> list[_Segment]:
+        text = page.page_content or ""
+        metadata = page.metadata or {}
+        paragraphs = []
+        pos = 0
+        for m in PARAGRAPH_RE.finditer(text):
+            paragraphs.append((pos, text[pos:m.start()]))
+            pos = m.end()
+        paragraphs.append((pos, text[pos:]))
+        paragraphs = [(o, p) for o, p in paragraphs if p.strip()]
+
+        token_lists = self.encoding.encode_ordinary_batch([p for _, p in paragraphs])
+        segments = []
+        for (offset, paragraph), tokens in zip(paragraphs, token_lists):
+            if len(tokens) <= self.chunk_tokens:
+                segments.append(_Segment(paragraph, len(tokens), seq, offset, "\n\n", metadata))
+            else:
+                segments.extend(self._split_long(paragraph, offset, seq, metadata))
+        return segments
+
+    def _emit(self) -> Document:
+        segments = list(self.buffer)
+        text = segments[0].text + "".join(s.sep + s.text for s in segments[1:])
+        first = segments[0]
+        pages = [s.metadata.get("page") for s in segments if s.metadata.get("page") is not None]
+        metadata = {
+            **first.metadata,
+            "start_index": first.offset,
+            "page_start": min(pages) if pages else None,
+            "page_end": max(pages) if pages else None,
+        }
+
+        # хвост до overlap_tokens — начало следующего чанка
+        overlap = deque()
+        overlap_tokens = 0
+        while segments and overlap_tokens + segments[-1].tokens <= self.overlap_tokens and len(overlap) < len(self.buffer) - 1:
+            s = segments.pop()
+            overlap.appendleft(s)
+            overlap_tokens += s.tokens
+        self.buffer = overlap
+        self.buffer_tokens = overlap_tokens
+        self.fresh = 0
+        return Document(page_content=text, metadata=metadata)
+
+    def feed(self, pages: Iterable[Document]) -> list[Document]:
+        """Добавляет страницы, возвращает чанки, которые уже набрались."""
+        chunks = []
+        for page in pages:
+            for segment in self._segments(page, self.seq):
+                if self.buffer_tokens + segment.tokens > self.chunk_tokens:
+                    if self.fresh:
+                        chunks.append(self._emit())
+                    if self.buffer_tokens + segment.tokens > self.chunk_tokens:
+                        self.buffer.clear()  # перекрытие не помещается вместе с сегментом
+                        self.buffer_tokens = 0
+                self.buffer.append(segment)
+                self.buffer_tokens += segment.tokens
+                self.fresh += 1
+            self.seq += 1
+        return chunks
+
+    def finish(self) -> list[Document]:
+        """Последний неполный чанк книги."""
+        chunks = [self._emit()] if self.fresh else []
+        self.buffer.clear()
+        self.buffer_tokens = 0
+        return chunks
+
+
+def chunk_pages(pages: Iterable[Document], **kwargs) -> list[Document]:
+    chunker = PageChunker(**kwargs)
+    return chunker.feed(pages) + chunker.finish()
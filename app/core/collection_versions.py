@@ -0,0 +1,104 @@
+# app/core/collection_versions.py
+# Версионированные коллекции Qdrant: данные лежат в <base>_vN,
+# чтение и запись идут через алиас <base> (settings.QDRANT_COLLECTION).
+import re
+from datetime import datetime
+
+from qdrant_client.http import models as qmodels
+
+from app.core.db import SessionLocal
+from app.core.near_dedup import drop_collection_signatures
+from app.core.progress import redis_client
+from app.core.vectorstore import building_key, client, physical_collection
+
+
+def version_name(base: str, version: int) -> str:
+    return f"{base}_v{version}"
+
+
+def list_versions(base: str) -> list[tuple[int, str]]:
+    """[(N, '<base>_vN'), ...] по возрастанию N."""
+    pattern = re.compile(rf"^{re.escape(base)}_v(\d+)$")
+    versions = []
+    for c in client.get_collections().collections:
+        m = pattern.match(c.name)
+        if m:
+            versions.append((int(m.group(1)), c.name))
+    return sorted(versions)
+
+
+def alias_target(alias: str) -> str | None:
+    """Коллекция, на которую сейчас указывает алиас (None — алиаса нет)."""
+    target = physical_collection(alias)
+    return target if target != alias else None
+
+
+def create_next_version(base: str) -> str:
+    """
+    Создаёт пустую <base>_v(N+1) с теми же параметрами векторов,
+    что у текущей (живой) коллекции.
+    """
+    versions = list_versions(base)
+    next_version = versions[-1][0] + 1 if versions else 1
+    name = version_name(base, next_version)
+
+    live = client.get_collection(base)  # алиас или старая физическая коллекция
+    client.create_collection(collection_name=name, vectors_config=live.config.params.vectors)
+    return name
+
+
+def _build_started_key(collection_name: str) -> str:
+    return f"collections:{collection_name}:build_started"
+
+
+def start_build(alias: str, collection_name: str, started: datetime):
+    """С этого момента живая индексация (write_chunks по алиасу) пишет и в collection_name."""
+    redis_client.set(_build_started_key(collection_name), started.isoformat())
+    redis_client.sadd(building_key(alias), collection_name)
+
+
+def build_started(collection_name: str) -> datetime | None:
+    raw = redis_client.get(_build_started_key(collection_name))
+    return datetime.fromisoformat(raw) if raw else None
+
+
+def finish_build(alias: str, collection_name: str):
+    redis_client.srem(building_key(alias), collection_name)
+    redis_client.delete(_build_started_key(collection_name))
+
+
+def swap_alias(alias: str, collection_name: str):
+    """
+    Атомарно переключает алиас на collection_name.
+    Если вместо алиаса ещё существует физическая коллекция с тем же именем
+    (до первого переключения), её придётся удалить — это единственный момент,
+    когда поиск кратко недоступен.
+    """
+    if alias_target(alias) is None and alias in {c.name for c in client.get_collections().collections}:
+        client.delete_collection(alias)
+        with SessionLocal() as session:
+            drop_collection_signatures(session, alias)
+
+    operations = []
+    if alias_target(alias) is not None:
+        operations.append(qmodels.DeleteAliasOperation(delete_alias=qmodels.DeleteAlias(alias_name=alias)))
+    operations.append(qmodels.CreateAliasOperation(
+        create_alias=qmodels.CreateAlias(collection_name=collection_name, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+
+
+def gc_versions(base: str, keep: int = 2) -> list[str]:
+    """Удаляет старые версии, кроме живой и keep последних. Возвращает удалённые."""
+    live = alias_target(base)
+    versions = [name for _, name in list_versions(base)]
+    keep_names = set(versions[-keep:]) | {live}
+    removed = []
+    for name in versions:
+        if name not in keep_names:
+            finish_build(base, name)  # брошенная сборка — иначе write_chunks создаст её заново
+            client.delete_collection(name)
+            with SessionLocal() as session:
+                drop_collection_signatures(session, name)
+            removed.append(name)
+    return removed
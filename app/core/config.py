@@ -15,8 +15,13 @@ class Settings(BaseSettings):
 
     REDIS_URL: str
     REDIS_PORT: str
+    JOB_DB_FLUSH_SECONDS: int = 30    # как часто прогресс job пишется в Postgres (в Redis — всегда)
 
     TESSERACT_CMD: str
+    OCR_ENABLED: bool = True          # сканы индексируем через OCR, а не отбрасываем
+    OCR_WORKERS: int = 2              # процессов tesseract на одну книгу
+    OCR_LANG: str = "rus+kaz+eng"
+    OCR_DPI: int = 300
 
     DB_NAME: str
     DB_USERNAME: str
@@ -24,12 +29,45 @@ class Settings(BaseSettings):
     DB_PORT: str
     DB_HOST: str
 
-    CHUNK_SIZE: int = 1000
+    CHUNK_SIZE: int = 1000            # символов — только для заглавий каталога
     CHUNK_OVERLAP: int = 150
+    CHUNK_TOKENS: int = 400           # размер чанка книги в токенах модели эмбеддингов
+    CHUNK_OVERLAP_TOKENS: int = 60
+
+    # Почти-дубликаты чанков (переиздания): MinHash + LSH, дубликат не эмбеддится
+    NEAR_DUP_ENABLED: bool = True
+    NEAR_DUP_THRESHOLD: float = 0.85  # оценка Жаккара по словным 5-шинглам
+    MINHASH_PERMUTATIONS: int = 128
+    LSH_BANDS: int = 16               # 16 полос × 8 строк: кандидаты с порога ≈ 0.7
     TOP_K: int = 5
 
+    EMBEDDING_MODEL: str = "text-embedding-3-small"  # или "text-embedding-3-large"
+    EMBEDDING_CACHE_ENABLED: bool = True  # кэш векторов чанков в Postgres (embedding_cache)
+
+    # Пакетная запись чанков в Qdrant
+    EMBED_BATCH_SIZE: int = 64        # чанков в одном запросе к embeddings API
+    EMBED_CONCURRENCY: int = 4        # параллельных запросов к embeddings API
+    INDEX_PAGE_WINDOW: int = 20       # страниц книги в памяти одновременно
+    TITLE_BATCH_SIZE: int = 500       # заглавий каталога на один запрос к embeddings API
+    JOB_INSERT_BATCH_SIZE: int = 1000  # строк ingestion_jobs на один INSERT
+
+    # Загрузка файлов книг (KABIS, lib.tau-edu.kz)
+    DOWNLOAD_CONCURRENCY: int = 16
+    DOWNLOAD_PER_HOST: int = 4
+    DOWNLOAD_MAX_BYTES: int = 500 * 1024 * 1024
+    DOWNLOAD_TIMEOUT: int = 60
+
+    # Загрузка файлов пользователем (/api/upload, /api/uploads)
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024    # кусок потоковой записи на диск
+    UPLOAD_MAX_BYTES: int = 1024 * 1024 * 1024
+    QUALITY_CHECK_WORKERS: int = 2          # процессов для check_file вне event loop
+    QUALITY_SAMPLE_CHARS: int = 0           # >0: метрики текста по выборке такого размера (0 — весь текст)
+
     KABIS_USERNAME: str
     KABIS_PASSWORD: str
+    KABIS_SYNC_PAGE_SIZE: int = 500       # карточек каталога на один запрос /get_books_range
+    KABIS_SYNC_CONCURRENCY: int = 4
+    KABIS_PARSE_WORKERS: int = 0          # >1: карточки страницы разбираются в пуле процессов
 
     LIB_TAU_USER: str
     LIB_TAU_PASSWORD: str
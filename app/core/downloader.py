@@ -0,0 +1,150 @@
+# app/core/downloader.py
+# Параллельная потоковая загрузка книг (KABIS, lib.tau-edu.kz):
+# общий лимит и лимит на хост, запись кусками на диск, докачка через Range,
+# условный запрос по ETag/Last-Modified, ограничение размера файла.
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+
+CHUNK_SIZE = 256 * 1024
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    path: Path
+    status: str                 # downloaded | resumed | not_modified | too_large | error
+    size: int = 0
+    sha256: str | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("downloaded", "resumed", "not_modified")
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_name(path.name + ".download.json")
+
+
+def _part_path(path: Path) -> Path:
+    return path.with_name(path.name + ".part")
+
+
+def _read_meta(path: Path) -> dict:
+    try:
+        return json.loads(_meta_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: Path, meta: dict):
+    _meta_path(path).write_text(json.dumps(meta), encoding="utf-8")
+
+
+def _hash_existing(path: Path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h
+
+
+async def _download_one(client: httpx.AsyncClient, url: str, path: Path, max_bytes: int) -> DownloadResult:
+    meta = _read_meta(path)
+    part = _part_path(path)
+    headers = {}
+
+    if path.exists() and meta.get("complete"):
+        # файл уже скачан — спрашиваем, изменился ли он
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    elif part.exists() and meta.get("url") == url:
+        # недокачанный файл — продолжаем с места обрыва
+        headers["Range"] = f"bytes={part.stat().st_size}-"
+        if meta.get("etag"):
+            headers["If-Range"] = meta["etag"]
+
+    async with client.stream("GET", url, headers=headers) as resp:
+        if resp.status_code == 304:
+            return DownloadResult(url, path, "not_modified", path.stat().st_size, meta.get("sha256"))
+        if resp.status_code == 416:
+            # .part битый или уже длиннее файла — в следующий раз качаем заново
+            part.unlink(missing_ok=True)
+            return DownloadResult(url, path, "error", error="range not satisfiable")
+        resp.raise_for_status()
+
+        length = resp.headers.get("Content-Length")
+        offset = part.stat().st_size if resp.status_code == 206 else 0
+        if length is not None and offset + int(length) > max_bytes:
+            return DownloadResult(url, path, "too_large", offset + int(length))
+
+        h = _hash_existing(part) if offset else hashlib.sha256()
+        size = offset
+        meta = {
+            "url": url,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "complete": False,
+        }
+        _write_meta(path, meta)
+
+        too_large = False
+        with open(part, "ab" if offset else "wb") as f:
+            async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    too_large = True
+                    break
+                h.update(chunk)
+                f.write(chunk)
+
+    if too_large:
+        part.unlink(missing_ok=True)
+        return DownloadResult(url, path, "too_large", size)
+
+    part.replace(path)
+    meta.update({"complete": True, "sha256": h.hexdigest(), "size": size})
+    _write_meta(path, meta)
+    return DownloadResult(url, path, "resumed" if offset else "downloaded", size, meta["sha256"])
+
+
+async def download_many(items: list[tuple[str, Path]],
+                        concurrency: int | None = None,
+                        per_host: int | None = None,
+                        max_bytes: int | None = None) -> list[DownloadResult]:
+    """Скачивает [(url, path), ...]; результаты в том же порядке, ошибки не прерывают остальные."""
+    concurrency = concurrency or settings.DOWNLOAD_CONCURRENCY
+    per_host = per_host or settings.DOWNLOAD_PER_HOST
+    max_bytes = max_bytes or settings.DOWNLOAD_MAX_BYTES
+
+    total = asyncio.Semaphore(concurrency)
+    hosts: dict[str, asyncio.Semaphore] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(settings.DOWNLOAD_TIMEOUT, connect=30)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True) as client:
+        async def run(url: str, path: Path) -> DownloadResult:
+            host = hosts.setdefault(urlsplit(url).netloc, asyncio.Semaphore(per_host))
+            # сначала слот хоста, потом общий — иначе ждущие одного хоста занимают общие слоты
+            async with host, total:
+                try:
+                    return await _download_one(client, url, Path(path), max_bytes)
+                except (httpx.HTTPError, OSError) as e:
+                    return DownloadResult(url, Path(path), "error", error=str(e))
+
+        return await asyncio.gather(*(run(url, path) for url, path in items))
+
+
+def download_files(items: list[tuple[str, Path]], **kwargs) -> list[DownloadResult]:
+    """Синхронная обёртка для фоновых задач и воркеров."""
+    return asyncio.run(download_many(items, **kwargs))
@@ -1,8 +1,83 @@
+import hashlib
+import re
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
 from .config import settings
+from .db import SessionLocal
+from app.models.embedding_cache import EmbeddingCache
+
+
+def normalize_chunk_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_chunk_text(text).encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Обёртка над embeddings-бэкендом: векторы чанков кэшируются в Postgres
+    по (модель, sha256 нормализованного текста) в float16.
+    Пересборка коллекции с тем же текстом не ходит в embeddings API.
+    Запросы пользователей (embed_query) не кэшируются.
+    """
 
+    def __init__(self, backend: Embeddings, model: str):
+        self.backend = backend
+        self.model = model
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",  # или "text-embedding-3-large"
+    def _load(self, hashes: list[str]) -> dict[str, list[float]]:
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(EmbeddingCache.text_hash, EmbeddingCache.vector)
+                .where(EmbeddingCache.model == self.model, EmbeddingCache.text_hash.in_(set(hashes)))
+            ).all()
+        return {h: np.frombuffer(v, dtype="<f2").astype(np.float32).tolist() for h, v in rows}
+
+    def _store(self, items: dict[str, list[float]]):
+        if not items:
+            return
+        values = [
+            {"model": self.model, "text_hash": h, "vector": np.asarray(v, dtype="<f2").tobytes()}
+            for h, v in items.items()
+        ]
+        with SessionLocal() as session:
+            session.execute(insert(EmbeddingCache).values(values).on_conflict_do_nothing())
+            session.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [text_hash(t) for t in texts]
+        cached = self._load(hashes)
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+        if missing:
+            vectors = self.backend.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update(fresh)
+
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.backend.embed_query(text)
+
+
+openai_embeddings = OpenAIEmbeddings(
+    model=settings.EMBEDDING_MODEL,
     api_key=settings.OPENAI_SECRET_KEY
-)
\ No newline at end of file
+)
+
+embeddings = (
+    CachedEmbeddings(openai_embeddings, settings.EMBEDDING_MODEL)
+    if settings.EMBEDDING_CACHE_ENABLED
+    else openai_embeddings
+)
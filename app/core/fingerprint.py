@@ -0,0 +1,76 @@
+# app/core/fingerprint.py
+import hashlib
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.vectorstore import link_document
+from app.models.books import Document
+from app.models.kabis import Kabis
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+def file_sha256(path: str | Path) -> str:
+    """SHA-256 файла, читаем кусками — книга целиком в память не попадает."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def find_canonical_document(session: Session, sha256: str) -> Document | None:
+    """Первый документ с такими же байтами — его векторы уже есть (или будут) в Qdrant."""
+    stmt = (
+        select(Document)
+        .where(Document.content_sha256 == sha256, Document.canonical_id.is_(None))
+        .order_by(Document.uploaded_at)
+    )
+    return session.scalars(stmt).first()
+
+
+def attach_duplicate(session: Session, original: Document, **fields) -> Document:
+    """
+    Регистрирует новую каталожную запись как копию original:
+    без парсинга и эмбеддингов, ссылаясь на его векторы через canonical_id.
+    """
+    doc = Document(
+        content_sha256=original.content_sha256,
+        canonical_id=original.id,
+        is_indexed=original.is_indexed,
+        **fields,
+    )
+    session.add(doc)
+    session.commit()
+    session.refresh(doc)
+    if original.is_indexed:
+        link_duplicates(session, original, [doc])
+    # иначе original ещё в очереди — ссылки добавит воркер после индексации (link_duplicates)
+    return doc
+
+
+def payload_id_book(session: Session, doc: Document) -> str | None:
+    """id_book в payload чанков: у KABIS — номер книги каталога, Document.id_book — строка Kabis."""
+    if doc.source == "kabis" and doc.id_book:
+        kabis = session.get(Kabis, doc.id_book)
+        return kabis.id_book if kabis else doc.id_book
+    return doc.id_book
+
+
+def link_duplicates(session: Session, original: Document, duplicates: list[Document] | None = None,
+                    collection_name: str | None = None):
+    """
+    Копии original (canonical_id) получают его векторы: их doc_id/id_book дописываются
+    в чанки original, is_indexed — как у original.
+    collection_name — по умолчанию рабочая коллекция (алиас) и строящиеся версии.
+    """
+    if duplicates is None:
+        duplicates = session.scalars(select(Document).where(Document.canonical_id == original.id)).all()
+    owner = {"doc_id": original.id} if original.source in ("kabis", "library") else {"source": original.file_path}
+    for doc in duplicates:
+        link_document({"doc_id": doc.id, "id_book": payload_id_book(session, doc)},
+                      collection_name=collection_name, **owner)
+        doc.is_indexed = original.is_indexed
+    session.commit()
@@ -1,3 +1,4 @@
+from itertools import islice
 from pathlib import Path
 from langchain.schema import Document
 import platform
@@ -10,7 +11,11 @@ from langchain_community.document_loaders import (
     Docx2txtLoader,
     UnstructuredEPubLoader,
 )
-from typing import Optional
+from typing import Iterator, Optional
+
+from app.core.config import settings
+from app.core.ocr import ocr_pdf_pages
+from app.core.pdf_analysis import load_analysis, iter_page_texts, scanned_from_analysis
 
 
 if platform.system() == "Windows":
@@ -36,35 +41,91 @@ def is_text_based_pdf(path: str) -> bool:
         return False
 
 
-def load_docs(path: str, meta: Optional[dict] = None):
+def needs_ocr(path) -> bool:
+    """PDF-скан: текстового слоя нет или он слишком беден."""
+    analysis = load_analysis(path)
+    if analysis is not None:
+        return scanned_from_analysis(analysis)
+    return not is_text_based_pdf(str(path))
+
+
+def is_loadable(path) -> bool:
+    """PDF-скан загружаем только в режиме OCR, остальные форматы — всегда."""
+    p = Path(path)
+    if p.suffix.lower() == ".pdf":
+        if needs_ocr(p):
+            return settings.OCR_ENABLED
+        return True
+    return True
+
+
+def count_pages(path) -> int | None:
+    """Количество страниц для отчёта о прогрессе (None — заранее неизвестно)."""
     p = Path(path)
     suffix = p.suffix.lower()
+    if suffix == ".pdf":
+        analysis = load_analysis(p)
+        if analysis is not None:
+            return analysis.n_pages
+        try:
+            return len(PdfReader(str(p)).pages)
+        except Exception:
+            return None
+    if suffix in {".txt", ".md", ".docx"}:
+        return 1
+    return None
+
+
+def _iter_raw_pages(p: Path, start_page: int = 0) -> Iterator[Document]:
+    """start_page — сколько первых страниц пропустить (продолжение после ретрая)."""
+    suffix = p.suffix.lower()
 
     if suffix == ".pdf":
-        if is_text_based_pdf(str(p)):
-            docs = PyPDFLoader(str(p)).load()
-        else:
-            return False
-            # docs = UnstructuredPDFLoader(str(p), strategy="hi_res", ocr_strategy="none").load()
+        if settings.OCR_ENABLED and needs_ocr(p):
+            # скан: OCR страниц в пуле процессов, уверенность tesseract — в метаданных
+            for r in ocr_pdf_pages(p, start_page=start_page):
+                yield Document(page_content=r["text"], metadata={
+                    "source": str(p),
+                    "page": r["page"],
+                    "ocr_confidence": r["confidence"],
+                })
+            return
+        if load_analysis(p) is not None:
+            # текст уже извлечён при check_file — читаем артефакт, PDF не парсим
+            for page, text in iter_page_texts(p):
+                if page >= start_page:
+                    yield Document(page_content=text, metadata={"source": str(p), "page": page})
+            return
+        # lazy_load отдаёт страницы по одной — книга целиком в памяти не держится
+        yield from islice(PyPDFLoader(str(p)).lazy_load(), start_page, None)
+        # docs = UnstructuredPDFLoader(str(p), strategy="hi_res", ocr_strategy="none").load()
+
+    elif start_page > 0:
+        # остальные форматы — одна «страница» или загрузка целиком, частичного продолжения нет
+        yield from islice(_iter_raw_pages(p), start_page, None)
 
     elif suffix in {".txt", ".md"}:
-        docs = TextLoader(str(p), encoding="utf-8").load()
-        for d in docs:
+        for d in TextLoader(str(p), encoding="utf-8").load():
             d.metadata.setdefault("page", 1)
+            yield d
 
     elif suffix == ".docx":
-        docs = Docx2txtLoader(str(p)).load()
-        for d in docs:
+        for d in Docx2txtLoader(str(p)).load():
             d.metadata.setdefault("page", 1)
+            yield d
 
     elif suffix == ".epub":
-        docs = UnstructuredEPubLoader(str(p)).load()
-        for i, d in enumerate(docs, 1):
+        for i, d in enumerate(UnstructuredEPubLoader(str(p)).load(), 1):
             d.metadata.setdefault("page", i)
+            yield d
     else:
         raise ValueError(f"Неизвестный формат: {suffix}")
 
-    for d in docs:
+
+def iter_docs(path, meta: Optional[dict] = None, start_page: int = 0) -> Iterator[Document]:
+    """Постраничный генератор документов с метаданными книги (с start_page-й страницы)."""
+    p = Path(path)
+    for d in _iter_raw_pages(p, start_page):
         d.metadata.setdefault("source", str(p))
         if meta and "title_book" in meta and meta["title_book"]:
             d.metadata.setdefault("title_book", meta["title_book"])
@@ -72,8 +133,13 @@ def load_docs(path: str, meta: Optional[dict] = None):
             d.metadata.setdefault("doc_id", meta["doc_id"])
         else:
             d.metadata.setdefault("title", p.stem)
+        yield d
 
-    return docs
+
+def load_docs(path: str, meta: Optional[dict] = None):
+    if not is_loadable(path):
+        return False
+    return list(iter_docs(path, meta))
 
 
 def load_title_only(meta: dict) -> list[Document]:
@@ -100,7 +166,6 @@ def load_title_only(meta: dict) -> list[Document]:
         "has_text": False,       # признак, что текста нет
     }
 
-    print("META:", metadata)
     # добавляем все остальные поля, что передали
     for k, v in meta.items():
         metadata.setdefault(k, v)
@@ -0,0 +1,156 @@
+# app/core/near_dedup.py
+# Почти-дубликаты чанков (переиздания, репринты одного учебника):
+# MinHash-подпись по словным шинглам + LSH по полосам в Postgres.
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.chunk_signature import ChunkLink, ChunkSignature, ChunkSignatureBand
+
+SHINGLE_WORDS = 5
+MIN_WORDS = 20  # короче (заголовки, колонтитулы) — не сравниваем: совпадения случайны
+_PRIME = np.uint64(4294967311)  # простое > 2**32: (a*x + b) укладывается в uint64
+_MASK = np.uint64(0xFFFFFFFF)
+_WORD_RE = re.compile(r"\w+")
+
+# фиксированные коэффициенты — подписи сравнимы между процессами и запусками
+_rng = np.random.default_rng(20251112)
+_A = _rng.integers(1, 2 ** 32, size=settings.MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, size=settings.MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingle_hashes(text: str) -> np.ndarray | None:
+    """crc32 словных k-шинглов нормализованного текста (стабильны между процессами, в отличие от hash())."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), np.uint64, len(grams)))
+
+
+def minhash_signature(text: str) -> np.ndarray | None:
+    """None — текст слишком короткий для сравнения."""
+    x = shingle_hashes(text)
+    if x is None:
+        return None
+    return (((x[:, None] * _A[None, :] + _B[None, :]) % _PRIME) & _MASK).min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature: np.ndarray) -> list[int]:
+    """Хэш каждой из LSH_BANDS полос подписи (signed int64 для BigInteger)."""
+    rows = len(signature) // settings.LSH_BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(signature[i * rows:(i + 1) * rows].tobytes(), digest_size=8).digest(),
+                       "little", signed=True)
+        for i in range(settings.LSH_BANDS)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших минимумов."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def find_near_duplicates(session: Session,
+                         collection: str,
+                         items: list[tuple[str, str, str]],
+                         signatures: list[np.ndarray | None] | None = None,
+                         ) -> tuple[list[np.ndarray | None], dict[int, tuple[str, float]]]:
+    """
+    items: [(point_id, owner, text), ...]; signatures — их подписи, если уже посчитаны.
+    collection — физическая коллекция (не алиас): индекс подписей у каждой версии свой.
+    Возвращает подписи всех items и {индекс: (canonical_point_id, similarity)} для тех,
+    у кого в индексе есть чанк другого владельца с оценкой ≥ NEAR_DUP_THRESHOLD.
+    Чанки той же книги дубликатами не считаем — поиск внутри книги остаётся полным.
+    """
+    if signatures is None:
+        signatures = [minhash_signature(text) for _, _, text in items]
+    bands = [band_hashes(sig) if sig is not None else [] for sig in signatures]
+    keys = {(b, h) for item_bands in bands for b, h in enumerate(item_bands)}
+    if not keys:
+        return signatures, {}
+
+    band_rows = session.execute(
+        select(ChunkSignatureBand.band, ChunkSignatureBand.band_hash, ChunkSignatureBand.point_id)
+        .where(ChunkSignatureBand.collection == collection,
+               tuple_(ChunkSignatureBand.band, ChunkSignatureBand.band_hash).in_(keys))
+    ).all()
+    if not band_rows:
+        return signatures, {}
+
+    by_key: dict[tuple[int, int], list[str]] = {}
+    for band, band_hash, point_id in band_rows:
+        by_key.setdefault((band, band_hash), []).append(point_id)
+
+    candidates = {
+        point_id: (owner, np.frombuffer(sig, dtype=np.uint32))
+        for point_id, owner, sig in session.execute(
+            select(ChunkSignature.point_id, ChunkSignature.owner, ChunkSignature.signature)
+            .where(ChunkSignature.collection == collection,
+                   ChunkSignature.point_id.in_({p for _, _, p in band_rows}))
+        ).all()
+    }
+
+    matches = {}
+    for i, ((point_id, owner, _), sig, item_bands) in enumerate(zip(items, signatures, bands)):
+        best = None
+        for b, h in enumerate(item_bands):
+            for candidate_id in by_key.get((b, h), ()):
+                candidate = candidates.get(candidate_id)
+                if candidate is None or candidate_id == point_id or candidate[0] == owner:
+                    continue
+                score = similarity(sig, candidate[1])
+                if score >= settings.NEAR_DUP_THRESHOLD and (best is None or score > best[1]):
+                    best = (candidate_id, score)
+        if best is not None:
+            matches[i] = best
+    return signatures, matches
+
+
+def save_signatures(session: Session, collection: str, rows: list[tuple[str, str, np.ndarray]]):
+    """rows: [(point_id, owner, signature), ...] — чанки, записанные в Qdrant."""
+    rows = [r for r in rows if r[2] is not None]
+    if not rows:
+        return
+    session.execute(
+        insert(ChunkSignature)
+        .values([
+            {"collection": collection, "point_id": point_id, "owner": str(owner), "signature": sig.tobytes()}
+            for point_id, owner, sig in rows
+        ])
+        .on_conflict_do_nothing()
+    )
+    band_rows = [
+        {"collection": collection, "band": b, "band_hash": h, "point_id": point_id}
+        for point_id, _, sig in rows
+        for b, h in enumerate(band_hashes(sig))
+    ]
+    # ≤ 65535 параметров на запрос в Postgres
+    for i in range(0, len(band_rows), 5000):
+        session.execute(insert(ChunkSignatureBand).values(band_rows[i:i + 5000]).on_conflict_do_nothing())
+    session.commit()
+
+
+def save_links(session: Session, collection: str, rows: list[dict]):
+    """rows: [{point_id, canonical_point_id, owner, page, similarity}, ...]."""
+    if not rows:
+        return
+    session.execute(
+        insert(ChunkLink)
+        .values([{"collection": collection, **row} for row in rows])
+        .on_conflict_do_nothing()
+    )
+    session.commit()
+
+
+def drop_collection_signatures(session: Session, collection: str):
+    """Подписи и ссылки удалённой версии коллекции."""
+    for model in (ChunkSignatureBand, ChunkSignature, ChunkLink):
+        session.execute(delete(model).where(model.collection == collection))
+    session.commit()
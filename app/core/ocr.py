@@ -0,0 +1,134 @@
+# app/core/ocr.py
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from pathlib import Path
+from typing import Iterator
+
+import fitz
+import pytesseract
+from PIL import Image
+
+from app.core.config import settings
+
+pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
+
+
+def ocr_cache_dir(path) -> Path:
+    """Кэш OCR по страницам: <file>.ocr/<page>.json — ретрай не распознаёт страницу заново."""
+    p = Path(path)
+    return p.with_name(p.name + ".ocr")
+
+
+def open_ocr_cache(path) -> Path:
+    """
+    Каталог кэша для текущей версии файла. Файлы сохраняются по имени, и под тем же
+    именем может оказаться другая книга: кэш помечен size/mtime источника
+    (как артефакт pdf_analysis), при расхождении страницы распознаются заново.
+    """
+    cache = open_ocr_cache(path)
+    stat = os.stat(path)
+    source = {"size": stat.st_size, "mtime": stat.st_mtime}
+    stamp = cache / "source.json"
+    try:
+        current = json.loads(stamp.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        current = None
+    if current != source:
+        for f in cache.glob("*.json"):
+            f.unlink()
+        stamp.write_text(json.dumps(source), encoding="utf-8")
+    return cache
+
+
+def _ocr_page(path: str, page_no: int, dpi: int, lang: str) -> dict:
+    """Выполняется в дочернем процессе: растр страницы через fitz → tesseract."""
+    doc = fitz.open(path)
+    try:
+        pix = doc.load_page(page_no).get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    finally:
+        doc.close()
+
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+
+    # собираем слова в строки в том порядке, как их отдал tesseract
+    lines = {}
+    confs = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        confs.append(conf)
+    text = "\n".join(" ".join(ws) for ws in lines.values())
+
+    return {
+        "page": page_no,
+        "text": text,
+        "confidence": round(sum(confs) / len(confs), 2) if confs else 0.0,
+    }
+
+
+def _read_cached(cache: Path, page_no: int) -> dict | None:
+    f = cache / f"{page_no}.json"
+    if not f.exists():
+        return None
+    try:
+        return json.loads(f.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+
+
+def _write_cached(cache: Path, result: dict):
+    f = cache / f"{result['page']}.json"
+    tmp = f.with_suffix(".tmp")
+    tmp.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(f)
+
+
+def ocr_pdf_pages(path, workers: int | None = None, start_page: int = 0) -> Iterator[dict]:
+    """
+    Постраничный OCR скана в пуле процессов (OCR_WORKERS).
+    Отдаёт {"page", "text", "confidence"} строго по порядку страниц;
+    в полёте не больше 2*workers страниц, готовые страницы кэшируются на диск.
+    """
+    path = str(path)
+    workers = workers or settings.OCR_WORKERS
+    cache = open_ocr_cache(path)
+
+    with fitz.open(path) as doc:
+        n_pages = doc.page_count
+
+    pending = deque()
+    pages = iter(range(start_page, n_pages))
+    ctx = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        def submit_next() -> bool:
+            page_no = next(pages, None)
+            if page_no is None:
+                return False
+            cached = _read_cached(cache, page_no)
+            if cached is not None:
+                pending.append(cached)
+            else:
+                pending.append(pool.submit(_ocr_page, path, page_no, settings.OCR_DPI, settings.OCR_LANG))
+            return True
+
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            item = pending.popleft()
+            if isinstance(item, dict):
+                result = item
+            else:
+                result = item.result()
+                _write_cached(cache, result)
+            submit_next()
+            yield result
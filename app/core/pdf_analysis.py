@@ -0,0 +1,140 @@
+# app/core/pdf_analysis.py
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Iterator, Optional
+
+import fitz
+
+SCAN_SAMPLE_PAGES = 10   # по первым страницам решаем «скан / не скан»
+TEXT_SAMPLE_PAGES = 5    # по первым страницам считаем метрики качества текста
+
+
+@dataclass
+class PDFPageInfo:
+    chars: int
+    stripped_chars: int
+    images: Optional[int] = None  # считаем только для первых SCAN_SAMPLE_PAGES страниц
+
+
+@dataclass
+class PDFAnalysis:
+    """
+    Результат одного прохода fitz по PDF: статистика для check_file
+    и постраничный текст (в артефакте рядом с файлом) для загрузчика.
+    """
+    n_pages: int
+    pages: list[PDFPageInfo] = field(default_factory=list)
+    sample_text: str = ""
+    open_error: Optional[str] = None
+    size: int = 0
+    mtime: float = 0.0
+
+    @property
+    def has_text(self) -> bool:
+        return any(p.stripped_chars for p in self.pages)
+
+    @property
+    def total_chars(self) -> int:
+        return sum(p.chars for p in self.pages)
+
+
+def pages_artifact_path(path) -> Path:
+    p = Path(path)
+    return p.with_name(p.name + ".pages.jsonl")
+
+
+def analysis_artifact_path(path) -> Path:
+    p = Path(path)
+    return p.with_name(p.name + ".analysis.json")
+
+
+def analyze_pdf(path) -> PDFAnalysis:
+    """
+    Один проход по PDF: текст каждой страницы пишется в <file>.pages.jsonl,
+    статистика — в <file>.analysis.json. Воркер потом читает артефакт
+    и не парсит PDF повторно.
+    """
+    stat = os.stat(path)
+    try:
+        doc = fitz.open(path)
+    except Exception as e:
+        return PDFAnalysis(n_pages=0, open_error=str(e), size=stat.st_size, mtime=stat.st_mtime)
+
+    analysis = PDFAnalysis(n_pages=doc.page_count, size=stat.st_size, mtime=stat.st_mtime)
+    sample = []
+    with open(pages_artifact_path(path), "w", encoding="utf-8") as out:
+        for i in range(doc.page_count):
+            page = doc.load_page(i)
+            text = page.get_text("text") or ""
+            info = PDFPageInfo(chars=len(text), stripped_chars=len(text.strip()))
+            if i < SCAN_SAMPLE_PAGES:
+                info.images = len(page.get_images())
+            if i < TEXT_SAMPLE_PAGES:
+                sample.append(text)
+            analysis.pages.append(info)
+            out.write(json.dumps({"page": i, "text": text}, ensure_ascii=False) + "\n")
+    doc.close()
+
+    analysis.sample_text = " ".join(sample)
+    with open(analysis_artifact_path(path), "w", encoding="utf-8") as f:
+        json.dump(asdict(analysis), f, ensure_ascii=False)
+    return analysis
+
+
+def scanned_from_analysis(analysis: PDFAnalysis, min_text_per_page: int = 300,
+                          min_text_fraction: float = 0.3) -> bool:
+    """Определяет по готовому анализу, что PDF — скан (а не текстовый), без OCR."""
+    if analysis.open_error is not None:
+        return True
+
+    n_pages = analysis.n_pages
+    if n_pages == 0:
+        return True
+
+    sample = analysis.pages[:SCAN_SAMPLE_PAGES]
+    pages_with_text = sum(1 for p in sample if p.stripped_chars > min_text_per_page)
+    total_chars = sum(p.chars for p in sample)
+    image_pages = sum(1 for p in sample if p.images)
+
+    avg_chars = total_chars / max(1, len(sample))
+    text_fraction = pages_with_text / max(1, len(sample))
+
+    if text_fraction < min_text_fraction and image_pages > pages_with_text:
+        return True
+
+    if avg_chars < 200 and text_fraction < 0.4:
+        return True
+
+    return False
+
+
+def load_analysis(path) -> Optional[PDFAnalysis]:
+    """Сохранённый анализ, если он есть и файл с тех пор не менялся."""
+    a_path = analysis_artifact_path(path)
+    if not a_path.exists() or not pages_artifact_path(path).exists():
+        return None
+    try:
+        with open(a_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(path)
+    if data.get("size") != stat.st_size or data.get("mtime") != stat.st_mtime:
+        return None
+    data["pages"] = [PDFPageInfo(**p) for p in data.get("pages", [])]
+    return PDFAnalysis(**data)
+
+
+def ensure_analysis(path) -> PDFAnalysis:
+    """Сохранённый анализ текущей версии файла, иначе новый проход analyze_pdf."""
+    return load_analysis(path) or analyze_pdf(path)
+
+
+def iter_page_texts(path) -> Iterator[tuple[int, str]]:
+    """Постранично читает текст из артефакта — без повторного парсинга PDF."""
+    with open(pages_artifact_path(path), encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            yield row["page"], row["text"]
@@ -0,0 +1,235 @@
+# app/core/progress.py
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.models.job import Job, JobStatus
+
+STATE_TTL_SECONDS = 24 * 3600
+JOB_STEPS = ("start", "extract", "embed", "pages", "titles", "index")  # шаги, по которым считаем длительность
+TERMINAL_STATUSES = {JobStatus.succeeded.value, JobStatus.failed.value, JobStatus.canceled.value}
+
+redis_client = redis.Redis(host=settings.REDIS_URL, port=int(settings.REDIS_PORT), db=0, decode_responses=True)
+
+
+def job_channel(job_id: str) -> str:
+    return f"jobs:{job_id}:events"
+
+
+def job_state_key(job_id: str) -> str:
+    return f"jobs:{job_id}:state"
+
+
+def _jsonable(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    if isinstance(v, JobStatus):
+        return v.value
+    return v
+
+
+def publish_progress(job_id: str, **fields):
+    """Последнее состояние job → Redis hash, событие → pub/sub канал job."""
+    event = {k: _jsonable(v) for k, v in fields.items() if v is not None}
+    event["job_id"] = job_id
+    event["ts"] = time.time()
+    pipe = redis_client.pipeline()
+    pipe.hset(job_state_key(job_id), mapping={k: json.dumps(v) for k, v in event.items()})
+    pipe.expire(job_state_key(job_id), STATE_TTL_SECONDS)
+    pipe.publish(job_channel(job_id), json.dumps(event, ensure_ascii=False))
+    pipe.execute()
+
+
+CHECKPOINT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def job_checkpoint_key(job_id: str) -> str:
+    return f"jobs:{job_id}:checkpoint"
+
+
+def load_checkpoint(job_id: str) -> dict | None:
+    """
+    Состояние чанкера, с которого ретрай продолжит job (JobReporter.checkpoint).
+    Без него книга индексируется заново: checkpoint_page в строке job — только
+    счётчик, по одной странице чанки первого запуска не восстановить.
+    """
+    raw = redis_client.get(job_checkpoint_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+CRAWL_COUNTERS = ("enqueued", "downloaded", "duplicate", "rejected", "download_failed", "failed", "skipped")
+
+
+def crawl_state_key(batch_id: str) -> str:
+    return f"crawls:{batch_id}:state"
+
+
+def crawl_start(batch_id: str, source: str):
+    redis_client.hset(crawl_state_key(batch_id), mapping={
+        "source": source,
+        "status": "enqueuing",
+        "started_at": datetime.utcnow().isoformat(),
+        **{c: 0 for c in CRAWL_COUNTERS},
+    })
+    redis_client.expire(crawl_state_key(batch_id), CHECKPOINT_TTL_SECONDS)
+
+
+def crawl_set(batch_id: str, **fields):
+    redis_client.hset(crawl_state_key(batch_id), mapping=fields)
+
+
+# HGET+HSET одним скриптом: отмена между проверкой и записью не перетирается
+_SET_STATUS_UNLESS_CANCELED = redis_client.register_script("""
+if redis.call('HGET', KEYS[1], 'status') == 'canceled' then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[1])
+return 1
+""")
+
+
+def crawl_set_status(batch_id: str, status: str) -> bool:
+    """Выставляет статус обхода, если он не отменён; False — обход уже canceled."""
+    return bool(_SET_STATUS_UNLESS_CANCELED(keys=[crawl_state_key(batch_id)], args=[status]))
+
+
+def crawl_incr(batch_id: str, counter: str, n: int = 1):
+    redis_client.hincrby(crawl_state_key(batch_id), counter, n)
+
+
+def crawl_is_canceled(batch_id: str) -> bool:
+    return redis_client.hget(crawl_state_key(batch_id), "status") == "canceled"
+
+
+def get_crawl_state(batch_id: str) -> dict | None:
+    raw = redis_client.hgetall(crawl_state_key(batch_id))
+    if not raw:
+        return None
+    return {k: int(v) if k in CRAWL_COUNTERS else v for k, v in raw.items()}
+
+
+def get_progress_state(job_id: str) -> dict | None:
+    raw = redis_client.hgetall(job_state_key(job_id))
+    if not raw:
+        return None
+    return {k: json.loads(v) for k, v in raw.items()}
+
+
+class JobReporter:
+    """
+    Прогресс job: каждое событие уходит в Redis (дёшево, для SSE),
+    а в Postgres пишем только старт, финал и не чаще раза в JOB_DB_FLUSH_SECONDS.
+    """
+
+    def __init__(self, db, job_id: str):
+        self.db = db
+        self.job_id = job_id
+        self.fields: dict = {}
+        self.last_flush = 0.0
+        self.step_durations: dict[str, float] = {}
+        self.current_step: str | None = None
+        self.step_started = time.monotonic()
+
+    def _track_step(self, step: str | None):
+        """Копит длительность каждого шага в секундах (для /api/jobs/stats)."""
+        if step == self.current_step:
+            return
+        now = time.monotonic()
+        if self.current_step is not None:
+            spent = self.step_durations.get(self.current_step, 0.0) + (now - self.step_started)
+            self.step_durations[self.current_step] = round(spent, 3)
+        self.current_step = step
+        self.step_started = now
+        self.fields["step_durations"] = dict(self.step_durations)
+
+    def flush(self):
+        job = self.db.get(Job, self.job_id)
+        if job is None:
+            return
+        for k, v in self.fields.items():
+            setattr(job, k, v)
+        self.db.commit()
+        self.last_flush = time.monotonic()
+
+    def update(self, force_flush: bool = False, **fields):
+        if "current_step" in fields:
+            self._track_step(fields["current_step"])
+        self.fields.update(fields)
+        publish_progress(self.job_id, **self.fields)
+        if force_flush or time.monotonic() - self.last_flush >= settings.JOB_DB_FLUSH_SECONDS:
+            self.flush()
+
+    def start(self):
+        self.update(force_flush=True,
+                    status=JobStatus.processing,
+                    current_step="start",
+                    progress_pct=1,
+                    started_at=datetime.utcnow())
+
+    def step(self, step: str, progress_pct: int | None = None, **counters):
+        fields = {"current_step": step, **counters}
+        if progress_pct is not None:
+            fields["progress_pct"] = progress_pct
+        self.update(**fields)
+
+    def checkpoint(self, state: dict):
+        """Чанки до state записаны — ретрай продолжит со страницы state["seq"] с тем же буфером."""
+        redis_client.set(job_checkpoint_key(self.job_id), json.dumps(state, ensure_ascii=False),
+                         ex=CHECKPOINT_TTL_SECONDS)
+        self.fields["checkpoint_page"] = state["seq"]
+
+    def succeed(self):
+        redis_client.delete(job_checkpoint_key(self.job_id))
+        self.update(force_flush=True,
+                    status=JobStatus.succeeded,
+                    current_step="done",
+                    progress_pct=100,
+                    finished_at=datetime.utcnow())
+
+    def retry(self, error: Exception):
+        """Попытка упала, dramatiq повторит job: статус не финальный, finished_at не ставим."""
+        self.update(force_flush=True,
+                    status=JobStatus.processing,
+                    current_step="retrying",
+                    error_message=str(error))
+
+    def fail(self, error: Exception):
+        self.update(force_flush=True,
+                    status=JobStatus.failed,
+                    current_step="error",
+                    error_message=str(error),
+                    finished_at=datetime.utcnow())
+
+
+async def stream_job_events(job_id: str, load_state):
+    """
+    SSE-генератор: подписываемся на канал job, отдаём текущее состояние
+    (load_state() — Redis или БД), затем события до финального статуса.
+    """
+    client = aioredis.Redis(host=settings.REDIS_URL, port=int(settings.REDIS_PORT), db=0, decode_responses=True)
+    pubsub = client.pubsub()
+    # сначала подписка, потом снимок состояния — иначе событие между ними потеряется
+    await pubsub.subscribe(job_channel(job_id))
+    try:
+        state = await asyncio.to_thread(load_state)
+        yield f"data: {json.dumps(state, ensure_ascii=False, default=str)}\n\n"
+        if state.get("status") in TERMINAL_STATUSES:
+            return
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=15.0)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {message['data']}\n\n"
+            if json.loads(message["data"]).get("status") in TERMINAL_STATUSES:
+                break
+    finally:
+        await pubsub.unsubscribe(job_channel(job_id))
+        await pubsub.close()
+        await client.close()
@@ -0,0 +1,91 @@
+# app/core/quality_reports.py
+# Отчёты check_file в Postgres по (sha256 файла, версия проверки):
+# повторный обход/загрузка тех же байтов не открывает файл заново.
+from pathlib import Path
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.book_quality_check import CHECKER_VERSION, check_file, check_file_async, ensure_analysis_async
+from app.core.config import settings
+from app.core.pdf_analysis import ensure_analysis, load_analysis
+from app.models.quality_report import QualityReport
+
+ACCEPTED_VERDICTS = ("OK_TEXT", "OK_TEXT_PDF", "OK_OCR")
+
+
+def quality_checker_version() -> str:
+    """Версия логики + настройки, меняющие вердикт: при их смене отчёты пересчитываются."""
+    version = CHECKER_VERSION
+    if settings.OCR_ENABLED:
+        version += "+ocr"
+    if settings.QUALITY_SAMPLE_CHARS:
+        version += f"+sample{settings.QUALITY_SAMPLE_CHARS}"
+    return version
+
+
+def get_quality_report(session: Session, sha256: str) -> dict | None:
+    row = session.get(QualityReport, (sha256, quality_checker_version()))
+    if row is None:
+        return None
+    return {**(row.metrics or {}), "verdict": row.verdict, "book_quality": row.book_quality, "cached": True}
+
+
+def save_quality_report(session: Session, sha256: str, report: dict):
+    metrics = {k: v for k, v in report.items() if k != "path"}
+    session.execute(
+        insert(QualityReport)
+        .values(
+            content_sha256=sha256,
+            checker_version=quality_checker_version(),
+            verdict=report["verdict"],
+            book_quality=report.get("book_quality"),
+            lang=report.get("lang"),
+            metrics=metrics,
+        )
+        .on_conflict_do_nothing()
+    )
+    session.commit()
+
+
+def _cacheable(report: dict) -> bool:
+    # пропавший/пустой файл — не свойство содержимого, такие отчёты не храним
+    return report.get("verdict") not in ("MISSING_FILE", "EMPTY_FILE")
+
+
+def _needs_page_artifact(path: str | Path, report: dict) -> bool:
+    """
+    Отчёт из кэша не создаёт артефакт анализа PDF для этого пути — без него воркер
+    взял бы текст страниц через PyPDF2, не тот, что при первой индексации (fitz).
+    """
+    return Path(path).suffix.lower() == ".pdf" and is_accepted(report) and load_analysis(path) is None
+
+
+def checked_file(session: Session, path: str | Path, sha256: str) -> dict:
+    """Сохранённый отчёт для этих байтов, иначе check_file и сохранение."""
+    report = get_quality_report(session, sha256)
+    if report is not None:
+        if _needs_page_artifact(path, report):
+            ensure_analysis(path)
+        return {**report, "path": str(path)}
+    report = check_file(str(path))
+    if _cacheable(report):
+        save_quality_report(session, sha256, report)
+    return report
+
+
+async def checked_file_async(session: Session, path: str | Path, sha256: str) -> dict:
+    """То же для event loop: проверка — в пуле процессов (check_file_async)."""
+    report = get_quality_report(session, sha256)
+    if report is not None:
+        if _needs_page_artifact(path, report):
+            await ensure_analysis_async(path)
+        return {**report, "path": str(path)}
+    report = await check_file_async(path)
+    if _cacheable(report):
+        save_quality_report(session, sha256, report)
+    return report
+
+
+def is_accepted(report: dict) -> bool:
+    return report["verdict"] in ACCEPTED_VERDICTS
@@ -1,17 +1,33 @@
+import hashlib
+import uuid
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
 from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_qdrant import Qdrant
 from .config import settings
+from app.core.chunking import PageChunker, chunk_pages
+from app.core.db import SessionLocal
 from app.core.embeddings import embeddings
+from app.core.near_dedup import find_near_duplicates, minhash_signature, save_links, save_signatures
+from app.core.progress import redis_client
 # Создаём клиента Qdrant
 client = QdrantClient(url=settings.QDRANT_URL)
 
-# Сплиттер для документов
+# Сплиттер для заглавий каталога (книги режет PageChunker)
 splitter = RecursiveCharacterTextSplitter(
     chunk_size=settings.CHUNK_SIZE,
-    chunk_overlap=settings.CHUNK_OVERLAP
+    chunk_overlap=settings.CHUNK_OVERLAP,
+    add_start_index=True,  # смещение чанка внутри страницы — часть id точки
 )
 
+# Пространство имён для детерминированных id чанков (uuid5)
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1d8c2e-3b7a-5e41-9c0d-2a7f4b8e1d53")
+
 # OpenAI embeddings
 
 # Векторное хранилище
@@ -22,32 +38,306 @@ vectorstore = Qdrant(
 )
 
 
-def ensure_collection_exists():
-    # лениво создаём коллекцию вызовом .from_documents при первой загрузке
-    pass
+_known_collections: set[str] = set()
+
+
+def ensure_collection_exists(collection_name: str, vector_size: int):
+    """Создаёт коллекцию (cosine, как у langchain Qdrant), если её ещё нет."""
+    if collection_name in _known_collections:
+        return
+    aliases = {a.alias_name for a in client.get_aliases().aliases}  # живые коллекции — алиасы на <name>_vN
+    if collection_name not in aliases and not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=qmodels.VectorParams(size=vector_size, distance=qmodels.Distance.COSINE),
+        )
+    _known_collections.add(collection_name)
+
+
+def _batches(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def chunk_owner(metadata: dict):
+    """Кому принадлежит чанк: doc_id, иначе id_book, иначе путь к файлу."""
+    return metadata.get("doc_id") or metadata.get("id_book") or metadata.get("source")
+
+
+def chunk_point_id(doc) -> str:
+    """
+    Детерминированный id точки: (doc_id, page, смещение, хэш текста).
+    Повторная индексация той же книги перезаписывает точки, а не дублирует их.
+    """
+    m = doc.metadata or {}
+    key = f"{chunk_owner(m)}|{m.get('page')}|{m.get('start_index')}|{content_hash(doc.page_content)}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
+
+
+def building_key(collection_name: str) -> str:
+    return f"collections:{collection_name}:building"
+
+
+def physical_collection(collection_name: str) -> str:
+    """Коллекция, на которую указывает алиас collection_name (или само имя, если это не алиас)."""
+    for a in client.get_aliases().aliases:
+        if a.alias_name == collection_name:
+            return a.collection_name
+    return collection_name
+
+
+def mirror_collections(collection_name: str) -> list[str]:
+    """
+    Версии, которые сейчас строит reindex_collection для алиаса collection_name:
+    живая индексация пишет и в них, чтобы после swap ничего не потерялось.
+    """
+    return sorted(redis_client.smembers(building_key(collection_name)))
+
+
+def _to_points(chunks, vectors) -> list[qmodels.PointStruct]:
+    # payload в том же формате, что пишет langchain Qdrant (page_content + metadata)
+    return [
+        qmodels.PointStruct(
+            id=chunk_point_id(d),
+            vector=vector,
+            payload={"page_content": d.page_content, "metadata": d.metadata},
+        )
+        for d, vector in zip(chunks, vectors)
+    ]
+
+
+def write_chunks(chunks,
+                 collection_name: str,
+                 on_progress: Callable[[int, int], None] | None = None,
+                 batch_size: int | None = None,
+                 mirrors: bool = True) -> int:
+    """
+    Конвейерная запись чанков: пока одни пакеты эмбеддятся
+    (до EMBED_CONCURRENCY параллельных запросов), готовые пакеты
+    по порядку отправляются в Qdrant. on_progress(done, total) вызывается
+    после каждого upsert. batch_size по умолчанию — EMBED_BATCH_SIZE.
+    Пока строится новая версия коллекции, те же точки пишутся и в неё
+    (mirrors=False — только в collection_name).
+    Возвращает количество записанных чанков.
+    """
+    total = len(chunks)
+    if not total:
+        return 0
+
+    done = 0
+    pending = deque()
+    batches = _batches(chunks, batch_size or settings.EMBED_BATCH_SIZE)
+    targets = [collection_name, *(mirror_collections(collection_name) if mirrors else [])]  # эмбеддим один раз
+
+    with ThreadPoolExecutor(max_workers=settings.EMBED_CONCURRENCY) as pool:
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            texts = [d.page_content for d in batch]
+            pending.append((batch, pool.submit(embeddings.embed_documents, texts)))
+            return True
+
+        # держим в полёте не больше EMBED_CONCURRENCY пакетов — память ограничена
+        for _ in range(settings.EMBED_CONCURRENCY):
+            if not submit_next():
+                break
+
+        while pending:
+            batch, future = pending.popleft()
+            vectors = future.result()
+            submit_next()
+
+            points = _to_points(batch, vectors)
+            for target in targets:
+                ensure_collection_exists(target, len(vectors[0]))
+                client.upsert(collection_name=target, points=points, wait=True)
+
+            done += len(batch)
+            if on_progress:
+                on_progress(done, total)
+
+    return done
+
+
+NEAR_DUP_BATCH = 500
+
+
+def link_to_canonical(collection_name: str, links: dict[str, list[dict]]):
+    """
+    Владельцы почти-дубликатов дописываются в payload канонического чанка
+    (linked_doc_ids / linked_id_books) — поиск внутри их книг его находит.
+    """
+    if not links:
+        return
+    for point in client.retrieve(collection_name=collection_name, ids=list(links), with_payload=True):
+        metadata = dict((point.payload or {}).get("metadata") or {})
+        if _add_links(metadata, links[str(point.id)]):
+            client.set_payload(collection_name=collection_name, payload={"metadata": metadata}, points=[point.id])
+
+
+def _add_links(metadata: dict, links: list[dict]) -> bool:
+    changed = False
+    for link in links:
+        for field, value in (("linked_doc_ids", link.get("doc_id")), ("linked_id_books", link.get("id_book"))):
+            if value is not None and str(value) not in metadata.get(field, []):
+                metadata[field] = [*metadata.get(field, []), str(value)]
+                changed = True
+    return changed
 
 
-def index_documents(docs):
+def link_document(link: dict, doc_id: str | None = None, source: str | None = None,
+                  collection_name: str | None = None) -> int:
+    """
+    Все чанки книги (по metadata.doc_id, у загрузок без doc_id — по metadata.source)
+    получают link["doc_id"] / link["id_book"] в linked_doc_ids / linked_id_books:
+    копия книги из другого источника ищется по своим id через book_filter.
+    Возвращает количество обновлённых точек.
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION
+    key, value = ("metadata.doc_id", doc_id) if doc_id else ("metadata.source", source)
+    owner_filter = qmodels.Filter(must=[qmodels.FieldCondition(key=key, match=qmodels.MatchValue(value=str(value)))])
+    updated = 0
+    for target in [collection_name, *mirror_collections(collection_name)]:
+        offset = None
+        while True:
+            points, offset = client.scroll(collection_name=target, scroll_filter=owner_filter, limit=NEAR_DUP_BATCH,
+                                           offset=offset, with_payload=True, with_vectors=False)
+            operations = []
+            for point in points:
+                metadata = dict((point.payload or {}).get("metadata") or {})
+                if _add_links(metadata, [link]):
+                    operations.append(qmodels.SetPayloadOperation(set_payload=qmodels.SetPayload(
+                        payload={"metadata": metadata}, points=[point.id])))
+            if operations:
+                client.batch_update_points(collection_name=target, update_operations=operations)
+                updated += len(operations)
+            if offset is None:
+                break
+    return updated
+
+
+def _write_deduplicated(session, collection_name: str, batch, items, signatures,
+                        on_progress: Callable[[int, int], None] | None = None) -> int:
+    """
+    Пакет чанков книги в одну физическую коллекцию: почти-дубликаты ищутся по её
+    индексу подписей и ссылаются на её канонические точки, остальные записываются.
+    Возвращает количество записанных и связанных чанков.
+    """
+    _, matches = find_near_duplicates(session, collection_name, items, signatures)
+
+    links: dict[str, list[dict]] = {}
+    link_rows = []
+    for i, (canonical_id, score) in matches.items():
+        m = batch[i].metadata or {}
+        links.setdefault(canonical_id, []).append(m)
+        link_rows.append({"point_id": items[i][0], "canonical_point_id": canonical_id,
+                          "owner": items[i][1], "page": m.get("page"), "similarity": score})
+    link_to_canonical(collection_name, links)
+    save_links(session, collection_name, link_rows)
+
+    kept = [i for i in range(len(batch)) if i not in matches]
+    report = (lambda done, total: on_progress(len(matches) + done, total)) if on_progress else None
+    written = write_chunks([batch[i] for i in kept], collection_name, report, mirrors=False)
+    # подпись — только после upsert: в индексе лишь чанки с вектором
+    save_signatures(session, collection_name, [(items[i][0], items[i][1], signatures[i]) for i in kept])
+    if matches:
+        print(f"[INFO] {collection_name}: почти-дубликатов связано {len(matches)} из {len(batch)}")
+    return len(matches) + written
+
+
+def write_book_chunks(chunks, collection_name: str, on_progress: Callable[[int, int], None] | None = None) -> int:
+    """
+    write_chunks для текста книг с подавлением почти-дубликатов: чанк, похожий
+    (MinHash ≥ NEAR_DUP_THRESHOLD) на уже записанный чанк другой книги, не эмбеддится,
+    а ссылается на него (chunk_links + payload канонического чанка).
+    Подписи ведутся по физической коллекции (алиас разрешается), у строящейся
+    версии — свои: её дубликаты ссылаются только на точки, которые в ней уже есть.
+    Возвращает количество чанков книги: записанных и связанных — книга из одних
+    почти-дубликатов (переиздание) тоже считается проиндексированной.
+    """
+    if not settings.NEAR_DUP_ENABLED or not chunks:
+        return write_chunks(chunks, collection_name, on_progress)
+
+    live = physical_collection(collection_name)
+    mirrors = [m for m in mirror_collections(collection_name) if m != live]
+    stored = 0
+    with SessionLocal() as session:
+        for batch in _batches(chunks, NEAR_DUP_BATCH):
+            items = [(chunk_point_id(d), str(chunk_owner(d.metadata or {})), d.page_content) for d in batch]
+            signatures = [minhash_signature(text) for _, _, text in items]
+            base = stored
+            report = (lambda done, _total: on_progress(base + done, len(chunks))) if on_progress else None
+            stored += _write_deduplicated(session, live, batch, items, signatures, report)
+            for mirror in mirrors:
+                _write_deduplicated(session, mirror, batch, items, signatures)
+    return stored
+
+
+def index_documents(docs, on_progress: Callable[[int, int], None] | None = None) -> int:
     # helper: чанкуем и индексируем
+    splits = chunk_pages(docs)
+    return write_book_chunks(splits, settings.QDRANT_COLLECTION, on_progress)
+
+
+def index_document_stream(pages: Iterable,
+                          total_pages: int | None = None,
+                          on_progress: Callable[[int, int, int], None] | None = None,
+                          collection_name: str | None = None,
+                          resume_state: dict | None = None,
+                          on_checkpoint: Callable[[dict], None] | None = None) -> int:
+    """
+    Потоковая индексация: берём из генератора окно INDEX_PAGE_WINDOW страниц,
+    чанкуем (PageChunker — чанки переходят через границы страниц и окон),
+    эмбеддим и пишем, затем следующее окно. Пиковая память не зависит
+    от длины книги. on_progress(pages_done, total_pages, chunks_done) — после каждого окна.
+    on_checkpoint(state) — после записи окна: состояние чанкера (поданные страницы +
+    недобранный буфер). resume_state — такое состояние прошлой попытки; pages тогда
+    должны начинаться со страницы resume_state["seq"].
+    Возвращает количество чанков книги (записанных и связанных почти-дубликатов).
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION
+    chunker = PageChunker.from_state(resume_state) if resume_state else PageChunker()
+    written = 0
+    window = []
+
+    def flush(final: bool = False):
+        nonlocal written, window
+        chunks = chunker.feed(window)
+        if final:
+            chunks += chunker.finish()
+        written += write_book_chunks(chunks, collection_name)
+        window = []
+        if on_checkpoint and not final:
+            on_checkpoint(chunker.state())
+        if on_progress:
+            on_progress(chunker.seq, max(total_pages or 0, chunker.seq), written)
+
+    for page in pages:
+        window.append(page)
+        if len(window) >= settings.INDEX_PAGE_WINDOW:
+            flush()
+    flush(final=True)
+    return written
+
+
+def index_title(docs) -> int:
     splits = splitter.split_documents(docs)
-    Qdrant.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        url=settings.QDRANT_URL,
-        prefer_grpc=False,
-        collection_name=settings.QDRANT_COLLECTION,
-    )
+    return write_chunks(splits, settings.QDRANT_TITLE_COLLECTION)  # 👈 другая коллекция
 
 
-def index_title(docs):
+def index_titles_bulk(docs) -> int:
+    """
+    Заглавия каталога страницей: вся страница — один запрос к embeddings API
+    и один upsert в Qdrant. Через тот же splitter, что index_title (start_index,
+    обрезка пробелов) — у строки каталога одни и те же id точек на обоих путях.
+    """
     splits = splitter.split_documents(docs)
-    Qdrant.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        url=settings.QDRANT_URL,
-        prefer_grpc=False,
-        collection_name=settings.QDRANT_TITLE_COLLECTION,  # 👈 другая коллекция
-    )
+    return write_chunks(splits, settings.QDRANT_TITLE_COLLECTION, batch_size=max(1, len(splits)))
 
 
 def get_title_retriever(k: int | None = None):
@@ -79,4 +369,99 @@ def get_book_retriever(score_threshold: float = 0.7):
             "k": 1000,  # Максимальное количество
             "score_threshold": 0.4  # Порог релевантности
         }
-    )
\ No newline at end of file
+    )
+
+
+# Поля payload, по которым фильтруем чанки одной книги
+BOOK_PAYLOAD_FIELDS = ("metadata.doc_id", "metadata.id_book", "metadata.linked_doc_ids", "metadata.linked_id_books")
+_payload_indexes_ready: set[str] = set()
+
+
+PAGE_PAYLOAD_FIELD = "metadata.page"
+
+
+def ensure_payload_indexes(collection_name: str | None = None):
+    """
+    Создаёт keyword-индексы по doc_id/id_book, чтобы фильтрованный поиск
+    внутри одной книги не сканировал всю коллекцию, и integer-индекс по номеру
+    страницы для курсора /api/book_passages. Вызывается при старте API
+    и при сборке новой версии коллекции, а не на запросе.
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION
+    if collection_name in _payload_indexes_ready:
+        return
+    for field in BOOK_PAYLOAD_FIELDS:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=qmodels.PayloadSchemaType.KEYWORD,
+        )
+    client.create_payload_index(
+        collection_name=collection_name,
+        field_name=PAGE_PAYLOAD_FIELD,
+        field_schema=qmodels.PayloadSchemaType.INTEGER,
+    )
+    _payload_indexes_ready.add(collection_name)
+
+
+def book_filter(doc_id: str | None = None, id_book: str | None = None) -> qmodels.Filter:
+    # чанк книги — свой или канонический чанк другой книги, к которому привязан её почти-дубликат
+    conditions = []
+    if doc_id:
+        conditions.append(qmodels.Filter(should=[
+            qmodels.FieldCondition(key="metadata.doc_id", match=qmodels.MatchValue(value=str(doc_id))),
+            qmodels.FieldCondition(key="metadata.linked_doc_ids", match=qmodels.MatchValue(value=str(doc_id))),
+        ]))
+    if id_book:
+        conditions.append(qmodels.Filter(should=[
+            qmodels.FieldCondition(key="metadata.id_book", match=qmodels.MatchValue(value=str(id_book))),
+            qmodels.FieldCondition(key="metadata.linked_id_books", match=qmodels.MatchValue(value=str(id_book))),
+        ]))
+    return qmodels.Filter(must=conditions)
+
+
+@lru_cache(maxsize=256)
+def query_vector(query: str) -> tuple[float, ...]:
+    """Эмбеддинг запроса; следующие страницы той же выдачи не эмбеддят его заново."""
+    return tuple(embeddings.embed_query(query))
+
+
+def search_in_book(query: str,
+                   doc_id: str | None = None,
+                   id_book: str | None = None,
+                   limit: int = 100,
+                   score_threshold: float = 0.3,
+                   page_from: int | None = None) -> list[dict]:
+    """
+    Поиск только по чанкам одной книги (payload-фильтр Qdrant).
+    Без реранкера: кандидатов мало, порядок задаёт номер страницы.
+    page_from — только чанки с этой страницы и дальше (курсор пагинации).
+    Возвращает до limit лучших фрагментов, отсортированных по (page, id).
+    """
+    query_filter = book_filter(doc_id, id_book)
+    if page_from is not None:
+        query_filter.must.append(qmodels.FieldCondition(key=PAGE_PAYLOAD_FIELD, range=qmodels.Range(gte=page_from)))
+    points = client.query_points(
+        collection_name=settings.QDRANT_COLLECTION,
+        query=list(query_vector(query)),
+        query_filter=query_filter,
+        limit=limit,
+        score_threshold=score_threshold,
+        with_payload=True,
+    ).points
+
+    passages = []
+    for p in points:
+        payload = p.payload or {}
+        m = payload.get("metadata") or {}
+        passages.append({
+            "id": str(p.id),
+            "page": m.get("page"),
+            "page_end": m.get("page_end", m.get("page")),
+            "score": p.score,
+            "text": payload.get("page_content") or "",
+            "doc_id": m.get("doc_id"),
+            "id_book": m.get("id_book"),
+        })
+    passages.sort(key=lambda x: (x["page"] if x["page"] is not None else -1, x["id"]))
+    return passages
@@ -1,13 +1,16 @@
+import asyncio
 import logging
 from fastapi import FastAPI, Depends
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from .core.config import settings
 from .core.cors import setup_cors
+from .core.vectorstore import ensure_payload_indexes
 from .api.routes.upload import router as upload_router
 from .api.routes.chat import router as chat_router
 from .api.routes.jobs import router as jobs_router
 from .api.routes.kabis_integrate import router as kabis_router
+from .api.routes.book_passages import router as book_passages_router
 from app.api.routes.libtau_integrate import router as lib_router
 from app.tasks import run_kabis_upload_task  # наш актор
 from app.api.routes import users
@@ -42,6 +45,7 @@ app.include_router(chat_router)
 app.include_router(jobs_router)
 app.include_router(kabis_router)
 app.include_router(lib_router)
+app.include_router(book_passages_router)
 
 # APScheduler
 scheduler = AsyncIOScheduler()
@@ -59,6 +63,12 @@ async def openapi(user=Depends(get_current_user)):
 
 @app.on_event("startup")
 async def startup_event():
+    # payload-индексы Qdrant для поиска внутри книги — один раз при старте, не на первом запросе
+    try:
+        await asyncio.to_thread(ensure_payload_indexes)
+    except Exception as e:
+        logger.warning(f"Qdrant payload-индексы не созданы: {e}")
+
     def enqueue_task():
         logger.info("⏰ Планировщик: ставим задачу run_kabis_upload_task в очередь")
         run_kabis_upload_task.send()
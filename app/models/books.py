@@ -25,3 +25,6 @@ class Document(Base):
     source = Column(String, nullable=True)
     id_book = Column(String, nullable=True)
 
+    content_sha256 = Column(String(64), nullable=True, index=True)  # отпечаток файла
+    canonical_id = Column(String, nullable=True)  # id документа с теми же байтами, чьи векторы используем
+
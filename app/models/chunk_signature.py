@@ -0,0 +1,38 @@
+# app/models/chunk_signature.py
+from sqlalchemy import Column, String, LargeBinary, DateTime, SmallInteger, BigInteger, Float, Integer
+from sqlalchemy.sql import func
+from app.core.db import Base
+
+
+class ChunkSignature(Base):
+    """MinHash-подпись записанного чанка (канонического, с вектором в Qdrant)."""
+    __tablename__ = "chunk_signatures"
+
+    collection = Column(String, primary_key=True)
+    point_id = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)                   # doc_id / id_book чанка
+    signature = Column(LargeBinary, nullable=False)          # uint32 × MINHASH_PERMUTATIONS
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ChunkSignatureBand(Base):
+    """LSH: хэш полосы подписи → чанк. Кандидаты в дубликаты — совпадение хотя бы одной полосы."""
+    __tablename__ = "chunk_signature_bands"
+
+    collection = Column(String, primary_key=True)
+    band = Column(SmallInteger, primary_key=True)
+    band_hash = Column(BigInteger, primary_key=True)
+    point_id = Column(String, primary_key=True)
+
+
+class ChunkLink(Base):
+    """Почти-дубликат, не получивший своего вектора: ссылается на канонический чанк."""
+    __tablename__ = "chunk_links"
+
+    collection = Column(String, primary_key=True)
+    point_id = Column(String, primary_key=True)              # id, который получил бы чанк
+    canonical_point_id = Column(String, nullable=False, index=True)
+    owner = Column(String, nullable=False)
+    page = Column(Integer, nullable=True)
+    similarity = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,13 @@
+# app/models/embedding_cache.py
+from sqlalchemy import Column, String, LargeBinary, DateTime
+from sqlalchemy.sql import func
+from app.core.db import Base
+
+
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"
+
+    model = Column(String, primary_key=True)                 # имя модели эмбеддингов
+    text_hash = Column(String(64), primary_key=True)         # sha256 нормализованного текста чанка
+    vector = Column(LargeBinary, nullable=False)             # float16, little-endian
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,6 +1,6 @@
 # app/models/job.py
 import uuid, enum
-from sqlalchemy import Column, String, Integer, Enum, DateTime, Text
+from sqlalchemy import Column, String, Integer, Enum, DateTime, Text, JSON, Index
 from sqlalchemy.sql import func
 from app.core.db import Base
 
@@ -18,13 +18,25 @@ class Job(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     document_id = Column(String, nullable=False)
+    batch_id = Column(String, nullable=True, index=True)  # массовая постановка (/api/index_kabis)
 
     status = Column(Enum(JobStatus), nullable=False, default=JobStatus.queued)
-    current_step = Column(String, nullable=True)       # extract|chunk|embed|index
+    current_step = Column(String, nullable=True)       # extract|embed|pages|index
     progress_pct = Column(Integer, nullable=False, default=0)
+    pages_total = Column(Integer, nullable=True)
+    pages_done = Column(Integer, nullable=True)
+    chunks_done = Column(Integer, nullable=True)
+    checkpoint_page = Column(Integer, nullable=True)  # страниц записано в Qdrant — с неё продолжит ретрай
+    step_durations = Column(JSON, nullable=True)      # {"extract": 1.2, "pages": 340.5, ...} секунды
 
     error_message = Column(Text, nullable=True)
 
     queued_at = Column(DateTime(timezone=True), server_default=func.now())
     started_at = Column(DateTime(timezone=True), nullable=True)
     finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingestion_jobs_queued_at_id", "queued_at", "id"),           # keyset-пагинация списка
+        Index("ix_ingestion_jobs_status_queued_at", "status", "queued_at"),   # фильтр по статусу
+        Index("ix_ingestion_jobs_finished_at", "finished_at"),                # статистика по окнам
+    )
@@ -10,7 +10,7 @@ class Kabis(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     position = Column(String, nullable=True) # pos
-    id_book = Column(String, nullable=True) # idbk
+    id_book = Column(String, nullable=True, unique=True, index=True) # idbk, ключ upsert каталога
     bbk_top = Column(String, nullable=True)
     bbk_tail = Column(String, nullable=True)
     bbk = Column(String, nullable=True)
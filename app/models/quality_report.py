@@ -0,0 +1,16 @@
+# app/models/quality_report.py
+from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.core.db import Base
+
+
+class QualityReport(Base):
+    __tablename__ = "quality_reports"
+
+    content_sha256 = Column(String(64), primary_key=True)    # sha256 байтов файла
+    checker_version = Column(String, primary_key=True)       # версия check_file + влияющие настройки
+    verdict = Column(String, nullable=False)                 # OK_TEXT | OK_TEXT_PDF | OK_OCR | LIKELY_SCANNED | ...
+    book_quality = Column(String, nullable=True)
+    lang = Column(String, nullable=True)
+    metrics = Column(JSON, nullable=True)                    # отчёт check_file целиком (без пути)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
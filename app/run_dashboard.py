@@ -8,6 +8,8 @@ from waitress import serve  # pip install waitress
 broker = RedisBroker(host="127.0.0.1", port=6379, db=0)  # namespace можно указать явно
 # Если используешь кастомные очереди, их нужно объявить:
 broker.declare_queue("default")
+for queue in ("ingest", "ingest_interactive", "ingest_files", "ingest_titles", "index"):
+    broker.declare_queue(queue)
 
 dramatiq.set_broker(broker)
 
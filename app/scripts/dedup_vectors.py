@@ -0,0 +1,63 @@
+# scripts/dedup_vectors.py
+# Удаляет дубликаты чанков, оставшиеся от индексации со случайными id.
+# Запуск: python -m app.scripts.dedup_vectors [collection] [--dry-run]
+import sys
+
+from qdrant_client.http import models as qmodels
+
+from app.core.config import settings
+from app.core.vectorstore import client, chunk_owner, content_hash
+
+SCROLL_LIMIT = 1000
+DELETE_BATCH = 500
+
+
+def find_duplicate_points(collection_name: str) -> list:
+    """
+    Дубликат — точка с тем же (владелец, страница, хэш текста), что уже встречалась.
+    Возвращает id лишних точек; первая встреченная копия остаётся.
+    """
+    seen: set[tuple] = set()
+    duplicates = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=SCROLL_LIMIT,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for p in points:
+            payload = p.payload or {}
+            m = payload.get("metadata") or {}
+            key = (str(chunk_owner(m)), str(m.get("page")), content_hash(payload.get("page_content") or ""))
+            if key in seen:
+                duplicates.append(p.id)
+            else:
+                seen.add(key)
+        if offset is None:
+            break
+    return duplicates
+
+
+def remove_duplicate_points(collection_name: str, dry_run: bool = False) -> int:
+    duplicates = find_duplicate_points(collection_name)
+    print(f"[INFO] {collection_name}: найдено дубликатов {len(duplicates)}")
+    if dry_run:
+        return len(duplicates)
+    for i in range(0, len(duplicates), DELETE_BATCH):
+        client.delete(
+            collection_name=collection_name,
+            points_selector=qmodels.PointIdsList(points=duplicates[i:i + DELETE_BATCH]),
+            wait=True,
+        )
+    print(f"[INFO] {collection_name}: удалено {len(duplicates)}")
+    return len(duplicates)
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    collections = args or [settings.QDRANT_COLLECTION, settings.QDRANT_TITLE_COLLECTION]
+    for name in collections:
+        remove_duplicate_points(name, dry_run="--dry-run" in sys.argv)
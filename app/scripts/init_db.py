@@ -2,4 +2,7 @@
 from app.core.db import Base, engine
 from app.models.job import Job  # noqa: F401 (важно импортировать)
 from app.models.books import Document  # noqa: F401 (важно импортировать)
+from app.models.embedding_cache import EmbeddingCache  # noqa: F401 (важно импортировать)
+from app.models.quality_report import QualityReport  # noqa: F401 (важно импортировать)
+from app.models.chunk_signature import ChunkSignature, ChunkSignatureBand, ChunkLink  # noqa: F401 (важно импортировать)
 Base.metadata.create_all(bind=engine)
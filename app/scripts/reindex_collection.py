@@ -0,0 +1,114 @@
+# scripts/reindex_collection.py
+# Переиндексация без простоя: строим <collection>_vN в фоне, проверяем,
+# затем атомарно переключаем алиас, старые версии удаляем.
+# Пока версия строится (до swap), живая индексация пишет и в неё.
+#
+#   python -m app.scripts.reindex_collection build          # новая версия, печатает её имя
+#   python -m app.scripts.reindex_collection swap book_tau_e5_v3
+#   python -m app.scripts.reindex_collection gc [keep]
+#   python -m app.scripts.reindex_collection status
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from app.core.collection_versions import (
+    alias_target, build_started, create_next_version, finish_build, gc_versions, list_versions, start_build,
+    swap_alias,
+)
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.fingerprint import link_duplicates
+from app.core.loaders import count_pages, is_loadable, iter_docs
+from app.core.vectorstore import ensure_payload_indexes, index_document_stream
+from app.models.books import Document
+from app.models.kabis import Kabis
+
+
+def document_meta(session, doc: Document) -> dict | None:
+    """Те же метаданные, с которыми документ индексировался впервые."""
+    if doc.source == "kabis":
+        kabis = session.get(Kabis, doc.id_book)
+        return {
+            "id_book": kabis.id_book if kabis else doc.id_book,
+            "title_book": doc.title,
+            "doc_id": doc.id,
+            "source_data": "kabis",
+        }
+    if doc.source == "library":
+        return {
+            "id_book": doc.id_book,
+            "title_book": doc.title,
+            "Library": True,
+            "doc_id": doc.id,
+            "source_data": "libtau",
+        }
+    return {"doc_id": doc.id}  # /api/upload
+
+
+def index_documents_into(collection_name: str, since: datetime | None = None) -> int:
+    indexed = 0
+    with SessionLocal() as session:
+        stmt = (
+            select(Document)
+            .where(Document.is_indexed.is_(True), Document.canonical_id.is_(None))
+            .order_by(Document.uploaded_at)
+        )
+        if since is not None:
+            # updated_at — когда воркер выставил is_indexed (книга могла ждать в очереди с до начала сборки)
+            stmt = stmt.where(func.coalesce(Document.updated_at, Document.uploaded_at) >= since)
+        for doc in session.scalars(stmt):
+            path = Path(doc.file_path)
+            if not path.exists() or not is_loadable(path):
+                print(f"[WARN] пропуск {doc.id}: файл недоступен ({path})")
+                continue
+            chunks = index_document_stream(
+                iter_docs(path, document_meta(session, doc)),
+                total_pages=count_pages(path),
+                collection_name=collection_name,
+            )
+            # копии книги (canonical_id) ищутся по ссылкам в payload её чанков — переносим их в версию
+            link_duplicates(session, doc, collection_name=collection_name)
+            indexed += 1
+            print(f"[INFO] {collection_name}: {doc.title} — {chunks} чанков")
+    return indexed
+
+
+def build(base: str) -> str:
+    started = datetime.now(timezone.utc)
+    name = create_next_version(base)
+    ensure_payload_indexes(name)
+    start_build(base, name, started)
+    print(f"[INFO] строим {name}")
+    n = index_documents_into(name)
+    # догоняем документы, проиндексированные во время сборки до того, как включилась двойная запись
+    n += index_documents_into(name, since=started)
+    print(f"[INFO] {name} готова: {n} документов. Проверьте её и выполните: swap {name}")
+    return name
+
+
+def swap(base: str, name: str):
+    # ещё раз догоняем книги, которые индексировались в момент старта сборки
+    started = build_started(name)
+    if started is not None:
+        n = index_documents_into(name, since=started)
+        print(f"[INFO] {name}: догнали {n} документов")
+    swap_alias(base, name)
+    finish_build(base, name)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    base = settings.QDRANT_COLLECTION
+
+    if command == "build":
+        build(base)
+    elif command == "swap":
+        swap(base, sys.argv[2])
+        print(f"[INFO] {base} → {sys.argv[2]}")
+    elif command == "gc":
+        keep = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        print(f"[INFO] удалены: {gc_versions(base, keep)}")
+    else:
+        print(f"[INFO] {base} → {alias_target(base)}; версии: {[n for _, n in list_versions(base)]}")
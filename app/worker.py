@@ -1,10 +1,17 @@
 # worker.py
 import dramatiq
 from dramatiq.brokers.redis import RedisBroker
-from datetime import datetime
+from dramatiq.middleware import CurrentMessage, TimeLimitExceeded
 from app.core.db import SessionLocal
-from app.core.loaders import load_docs, load_title_only
-from app.core.vectorstore import index_documents, index_title
+from app.core.progress import JobReporter, load_checkpoint, crawl_incr, crawl_is_canceled, crawl_set_status
+from app.core.quality_reports import checked_file, is_accepted
+from app.core.downloader import download_files
+from app.core.fingerprint import file_sha256, find_canonical_document, attach_duplicate, link_duplicates
+from app.core.loaders import iter_docs, count_pages, is_loadable, load_title_only
+from app.core.vectorstore import index_document_stream, index_title, index_titles_bulk
+import uuid
+from collections import Counter
+from sqlalchemy import insert, select, update
 from app.models.job import Job, JobStatus
 from pathlib import Path
 from app.models.books import Document
@@ -13,56 +20,84 @@ from app.models.kabis import Kabis
 from app.models.libtau import Library
 # 1) подключаем Redis
 broker = RedisBroker(host=settings.REDIS_URL, port=settings.REDIS_PORT, db=0)
+broker.add_middleware(CurrentMessage())
 dramatiq.set_broker(broker)
 
 
-def update_job(db, job_id, **fields):
-    job = db.get(Job, job_id)
-    for k, v in fields.items():
-        setattr(job, k, v)
-    db.commit()
+class NotLoadableError(Exception):
+    """Файл без извлекаемого текста — ретрай не поможет."""
+
+
+DEFAULT_MAX_RETRIES = 20  # как у dramatiq Retries
+
+
+def is_last_attempt() -> bool:
+    """Текущая попытка актора последняя: после неё dramatiq сообщение уже не повторит."""
+    message = CurrentMessage.get_current_message()
+    if message is None:
+        return True  # вызов не из воркера
+    actor = broker.get_actor(message.actor_name)
+    max_retries = message.options.get("max_retries", actor.options.get("max_retries", DEFAULT_MAX_RETRIES))
+    return message.options.get("retries", 0) >= max_retries
+
+
+def report_error(reporter: JobReporter, error: BaseException):
+    """failed — только когда повторов больше не будет, иначе job остаётся в работе."""
+    if isinstance(error, NotLoadableError) or is_last_attempt():
+        reporter.fail(error)
+    else:
+        reporter.retry(error)
+
+
+def job_progress(reporter: JobReporter, start_pct: int, end_pct: int, step: str = "pages"):
+    """
+    Колбэк для index_document_stream: реальные счётчики страниц/чанков → прогресс job
+    (чекпоинт для ретрая пишет on_checkpoint=reporter.checkpoint).
+    """
+    def report(pages_done: int, pages_total: int, chunks_done: int):
+        pct = start_pct + (end_pct - start_pct) * pages_done // max(1, pages_total)
+        reporter.step(step, pct, pages_done=pages_done, pages_total=pages_total, chunks_done=chunks_done)
+    return report
+
+
+def mark_document_indexed(db, meta: dict | None):
+    """
+    Document книги (meta["doc_id"]) в Qdrant — его подхватит пересборка коллекции;
+    копии, привязанные к нему, пока он ждал в очереди, получают его векторы.
+    """
+    if meta and meta.get("doc_id"):
+        document = db.get(Document, meta["doc_id"])
+        if document:
+            document.is_indexed = True
+            db.commit()
+            link_duplicates(db, document)
 
 
 def process_title_only(job_id: str, meta: dict):
     db = SessionLocal()
+    reporter = JobReporter(db, job_id)
     try:
-        update_job(db, job_id,
-                   status=JobStatus.processing,
-                   current_step="start",
-                   progress_pct=1,
-                   started_at=datetime.utcnow())
+        reporter.start()
 
         # === extract ===
-        update_job(db, job_id, current_step="extract", progress_pct=10)
+        reporter.step("extract", 10)
         docs = load_title_only(meta)
 
-        # === chunk ===
-        update_job(db, job_id, current_step="chunk", progress_pct=40)
-        index_title(docs)
-
-        # === embed ===
-        update_job(db, job_id, current_step="embed", progress_pct=70)
-        # ... эмбеддинги ...
+        # === chunk + embed + upsert ===
+        reporter.step("embed", 40)
+        chunks = index_title(docs)
 
         # === index ===
-        update_job(db, job_id, current_step="index", progress_pct=90)
+        reporter.step("index", 90, chunks_done=chunks)
         if meta and meta.get("id_book"):
             book = db.query(Kabis).filter(Kabis.id_book == str(meta["id_book"])).first()
             if book:
                 book.is_indexed = True
                 db.commit()
 
-        update_job(db, job_id,
-                   status=JobStatus.succeeded,
-                   current_step="done",
-                   progress_pct=100,
-                   finished_at=datetime.utcnow())
+        reporter.succeed()
     except Exception as e:
-        update_job(db, job_id,
-                   status=JobStatus.failed,
-                   current_step="error",
-                   error_message=str(e),
-                   finished_at=datetime.utcnow())
+        reporter.fail(e)
     finally:
         db.close()
 
@@ -70,49 +105,43 @@ def process_title_only(job_id: str, meta: dict):
 def process_file(job_id: str, filename: str, meta: dict | None = None):
     save_path = Path(settings.UPLOAD_DIR) / filename
     db = SessionLocal()
+    reporter = JobReporter(db, job_id)
     try:
-        update_job(db, job_id,
-                   status=JobStatus.processing,
-                   current_step="start",
-                   progress_pct=1,
-                   started_at=datetime.utcnow())
+        reporter.start()
 
         # === extract ===
-        update_job(db, job_id, current_step="extract", progress_pct=10)
-
-        docs = load_docs(save_path, meta) if meta else load_docs(save_path)
-        if not docs:
-            raise Exception("Документы не были загружены")
+        reporter.step("extract", 10)
 
-        # === chunk ===
-        update_job(db, job_id, current_step="chunk", progress_pct=40)
-        index_documents(docs)
+        if not is_loadable(save_path):
+            raise NotLoadableError("Документы не были загружены")
 
-        # === embed ===
-        update_job(db, job_id, current_step="embed", progress_pct=70)
+        # === extract → chunk → embed → upsert (окнами страниц, прогресс по страницам) ===
+        # после падения воркера продолжаем с чекпоинта: те же чанки и id точек, что без падения
+        resume = load_checkpoint(job_id)
+        written = index_document_stream(
+            iter_docs(save_path, meta, start_page=resume["seq"] if resume else 0),
+            total_pages=count_pages(save_path),
+            on_progress=job_progress(reporter, 10, 90),
+            resume_state=resume,
+            on_checkpoint=reporter.checkpoint,
+        )
+        if not written and not resume:
+            raise NotLoadableError("Документы не были загружены")
 
         # === index ===
-        update_job(db, job_id, current_step="index", progress_pct=90)
+        reporter.step("index", 90)
         if meta and meta.get("id_book"):
             book = db.query(Kabis).filter(Kabis.id_book == str(meta["id_book"])).first()
             if book:
                 book.file_is_index = True
-            document = db.query(Document).filter(Document.kabis_id == str(meta["id_book"])).first()
-            if document:
-                document.is_indexed = True
-            db.commit()
+        mark_document_indexed(db, meta)
+        db.commit()
 
-        update_job(db, job_id,
-                   status=JobStatus.succeeded,
-                   current_step="done",
-                   progress_pct=100,
-                   finished_at=datetime.utcnow())
-    except Exception as e:
-        update_job(db, job_id,
-                   status=JobStatus.failed,
-                   current_step="error",
-                   error_message=str(e),
-                   finished_at=datetime.utcnow())
+        reporter.succeed()
+    except (Exception, TimeLimitExceeded) as e:  # TimeLimitExceeded — BaseException
+        report_error(reporter, e)
+        if not isinstance(e, NotLoadableError):
+            raise  # dramatiq повторит job, продолжение — с чекпоинта
     finally:
         db.close()
 
@@ -120,51 +149,54 @@ def process_file(job_id: str, filename: str, meta: dict | None = None):
 def process_file_library(job_id: str, filename: str, meta: dict | None = None):
     save_path = Path(settings.UPLOAD_DIR) / filename
     db = SessionLocal()
+    reporter = JobReporter(db, job_id)
     try:
-        update_job(db, job_id,
-                   status=JobStatus.processing,
-                   current_step="start",
-                   progress_pct=1,
-                   started_at=datetime.utcnow())
+        reporter.start()
 
         # === extract ===
-        update_job(db, job_id, current_step="extract", progress_pct=10)
-
-        docs = load_docs(save_path, meta) if meta else load_docs(save_path)
+        reporter.step("extract", 10)
 
-        # === chunk ===
-        update_job(db, job_id, current_step="chunk", progress_pct=40)
-        index_documents(docs)
-
-        # === embed ===
-        update_job(db, job_id, current_step="embed", progress_pct=70)
+        # === extract → chunk → embed → upsert (окнами страниц, прогресс по страницам) ===
+        # после падения воркера продолжаем с чекпоинта: те же чанки и id точек, что без падения
+        resume = load_checkpoint(job_id)
+        index_document_stream(
+            iter_docs(save_path, meta, start_page=resume["seq"] if resume else 0),
+            total_pages=count_pages(save_path),
+            on_progress=job_progress(reporter, 10, 90),
+            resume_state=resume,
+            on_checkpoint=reporter.checkpoint,
+        )
 
         # === index ===
-        update_job(db, job_id, current_step="index", progress_pct=90)
+        reporter.step("index", 90)
         if meta and meta.get("id"):
             book = db.query(Library).filter(Library.id == str(meta["id"])).first()
             if book:
                 book.file_is_indexed = True
+        mark_document_indexed(db, meta)
+        db.commit()
 
-            db.commit()
-
-        update_job(db, job_id,
-                   status=JobStatus.succeeded,
-                   current_step="done",
-                   progress_pct=100,
-                   finished_at=datetime.utcnow())
-    except Exception as e:
-        update_job(db, job_id,
-                   status=JobStatus.failed,
-                   current_step="error",
-                   error_message=str(e),
-                   finished_at=datetime.utcnow())
+        reporter.succeed()
+    except (Exception, TimeLimitExceeded) as e:  # TimeLimitExceeded — BaseException
+        report_error(reporter, e)
+        if not isinstance(e, NotLoadableError):
+            raise  # dramatiq повторит job, продолжение — с чекпоинта
     finally:
         db.close()
 
 
-@dramatiq.actor(max_retries=5, min_backoff=30000, queue_name="ingest")
-def ingest_job(job_id: str, filename: str | None = None, meta: dict | None = None):
+# Очереди с приоритетами: у каждой свой пул воркеров (см. docker-compose.yml),
+# поэтому загрузка пользователя не ждёт за тысячами job массовой индексации.
+QUEUE_INTERACTIVE = "ingest_interactive"   # /api/upload
+QUEUE_FILES = "ingest_files"               # файлы KABIS / lib.tau-edu.kz
+QUEUE_TITLES = "ingest_titles"             # только заглавия каталога
+
+
+def run_ingest(job_id: str, filename: str | None = None, meta: dict | None = None):
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        if job is not None and job.status == JobStatus.canceled:
+            return  # обход отменён, пока сообщение ждало в очереди
     if not filename:
         process_title_only(job_id, meta)
     else:
@@ -173,3 +205,284 @@ def ingest_job(job_id: str, filename: str | None = None, meta: dict | None = Non
         else:
             process_file(job_id, filename, meta)
 
+
+# OCR нескольких сотен сканированных страниц идёт дольше 10 минут dramatiq по умолчанию;
+# после срабатывания лимита ретрай продолжит с чекпоинта
+FILE_INGEST_TIME_LIMIT = 4 * 3600 * 1000
+
+
+@dramatiq.actor(max_retries=5, min_backoff=30000, queue_name="ingest", time_limit=FILE_INGEST_TIME_LIMIT)
+def ingest_job(job_id: str, filename: str | None = None, meta: dict | None = None):
+    # старая общая очередь — дочитываем уже поставленные сообщения
+    run_ingest(job_id, filename, meta)
+
+
+@dramatiq.actor(max_retries=5, min_backoff=5000, queue_name=QUEUE_INTERACTIVE, priority=0,
+                time_limit=FILE_INGEST_TIME_LIMIT)
+def ingest_upload(job_id: str, filename: str, meta: dict | None = None):
+    run_ingest(job_id, filename, meta)
+
+
+@dramatiq.actor(max_retries=5, min_backoff=30000, queue_name=QUEUE_FILES, priority=10,
+                time_limit=FILE_INGEST_TIME_LIMIT)
+def ingest_file(job_id: str, filename: str, meta: dict | None = None):
+    run_ingest(job_id, filename, meta)
+
+
+@dramatiq.actor(max_retries=5, min_backoff=30000, queue_name=QUEUE_TITLES, priority=20)
+def ingest_title(job_id: str, meta: dict):
+    process_title_only(job_id, meta)
+
+
+def process_titles_batch(job_id: str):
+    """
+    Массовая индексация заглавий KABIS: читаем непроиндексированные строки
+    страницами по TITLE_BATCH_SIZE (keyset по id), эмбеддим страницу одним
+    запросом, пишем одним upsert и отмечаем is_indexed одним UPDATE.
+    """
+    db = SessionLocal()
+    reporter = JobReporter(db, job_id)
+    try:
+        reporter.start()
+        columns = [c.name for c in Kabis.__table__.columns]
+        last_id = ""
+        done = 0
+        while True:
+            rows = db.scalars(
+                select(Kabis)
+                .where(Kabis.is_indexed.is_not(True), Kabis.id > last_id)
+                .order_by(Kabis.id)
+                .limit(settings.TITLE_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            docs = []
+            for row in rows:
+                meta = {c: getattr(row, c) for c in columns}
+                if meta.get("title") or meta.get("author"):
+                    docs.extend(load_title_only(meta))
+            if docs:
+                index_titles_bulk(docs)
+
+            db.execute(
+                update(Kabis)
+                .where(Kabis.id.in_([r.id for r in rows]))
+                .values(is_indexed=True)
+            )
+            db.commit()
+            db.expunge_all()
+
+            done += len(rows)
+            reporter.step("titles", chunks_done=done)
+
+        reporter.succeed()
+    except (Exception, TimeLimitExceeded) as e:  # TimeLimitExceeded — BaseException
+        report_error(reporter, e)
+        raise  # dramatiq повторит job: уже отмеченные is_indexed строки пропускаются
+    finally:
+        db.close()
+
+
+@dramatiq.actor(max_retries=3, min_backoff=30000, queue_name=QUEUE_TITLES, priority=20,
+                time_limit=6 * 3600 * 1000)
+def index_titles_batch(job_id: str):
+    process_titles_batch(job_id)
+
+
+def create_title_jobs(batch_id: str) -> int:
+    """
+    Массовая постановка title-job: строки ingestion_jobs вставляются пачками
+    (один executemany INSERT на JOB_INSERT_BATCH_SIZE строк каталога),
+    затем сообщения для этой пачки уходят в очередь ingest_titles.
+    """
+    db = SessionLocal()
+    try:
+        columns = [c.name for c in Kabis.__table__.columns]
+        last_id = ""
+        total = 0
+        while True:
+            rows = db.execute(
+                select(*Kabis.__table__.columns)
+                .where(Kabis.is_indexed.is_not(True), Kabis.id > last_id)
+                .order_by(Kabis.id)
+                .limit(settings.JOB_INSERT_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            jobs = [
+                {"id": str(uuid.uuid4()), "document_id": str(uuid.uuid4()),
+                 "status": JobStatus.queued, "progress_pct": 0, "batch_id": batch_id}
+                for _ in rows
+            ]
+            db.execute(insert(Job), jobs)
+            db.commit()
+
+            for job, row in zip(jobs, rows):
+                ingest_title.send(job["id"], meta={c: getattr(row, c) for c in columns})
+            total += len(rows)
+        return total
+    finally:
+        db.close()
+
+
+@dramatiq.actor(max_retries=0, queue_name=QUEUE_TITLES, priority=0, time_limit=3600 * 1000)
+def enqueue_title_jobs(batch_id: str):
+    create_title_jobs(batch_id)
+
+
+KABIS_URL = "https://kabis.tau-edu.kz"
+
+
+def queue_catalog_file(session, save_path: Path, sha256: str, *,
+                       source: str, id_book: str, title: str | None,
+                       meta: dict, batch_id: str | None = None) -> str:
+    """
+    Скачанный файл каталожной записи (KABIS, lib.tau): дедупликация по хэшу →
+    проверка качества → Document (source, id_book) + job → ingest_file.
+    meta — payload чанков, doc_id дописывается здесь.
+    Возвращает "duplicate" | "rejected" | "downloaded".
+    """
+    file_type = save_path.name.split(".")[-1].lower()
+
+    # тот же файл уже пришёл из другого источника → привязываем к его векторам
+    original = find_canonical_document(session, sha256)
+    if original is not None and not (original.source == source and original.id_book == id_book):
+        attach_duplicate(
+            session, original,
+            title=title,
+            file_path=str(save_path),
+            file_type=file_type,
+            id_book=id_book,
+            source=source,
+        )
+        return "duplicate"
+
+    # отчёт по этим байтам уже есть (повторный обход) → файл не открываем
+    if not is_accepted(checked_file(session, save_path, sha256)):
+        return "rejected"
+
+    # тот же Document при повторном запуске → те же id чанков в Qdrant
+    doc = session.scalars(
+        select(Document).where(Document.id_book == id_book, Document.source == source)
+    ).first()
+    if doc is None:
+        doc = Document(
+            title=title,
+            file_path=str(save_path),
+            file_type=file_type,
+            id_book=id_book,
+            source=source,
+            content_sha256=sha256,
+        )
+        session.add(doc)
+        session.commit()
+        session.refresh(doc)
+
+    job = Job(document_id=doc.id, status=JobStatus.queued, batch_id=batch_id)
+    session.add(job)
+    session.commit()
+
+    ingest_file.send(job.id, save_path.name, meta={**meta, "doc_id": doc.id})
+    return "downloaded"
+
+
+def queue_kabis_book(session, batch_id: str, row: Kabis, save_path: Path, result) -> str:
+    """Скачанный файл книги KABIS → queue_catalog_file (job с batch_id обхода)."""
+    if not result.ok:
+        return "download_failed"
+    outcome = queue_catalog_file(
+        session, save_path, result.sha256 or file_sha256(save_path),
+        source="kabis",
+        id_book=row.id,
+        title=row.title or row.author,
+        meta={"id_book": row.id_book, "title_book": row.title or row.author, "source_data": "kabis"},
+        batch_id=batch_id,
+    )
+    # иначе file_is_index выставит process_file после успешной индексации
+    if outcome == "duplicate":
+        row.file_is_index = True
+        session.commit()
+    return outcome
+
+
+def process_kabis_books(batch_id: str, kabis_ids: list[str]) -> Counter:
+    """
+    Пачка книг обхода KABIS: файлы качаются одним download_files — общий httpx-клиент
+    и лимит DOWNLOAD_PER_HOST действуют на всю пачку, — затем каждая книга
+    ставится в индексацию. Возвращает итоги для сводки {итог: книг}.
+    """
+    outcomes = Counter()
+    with SessionLocal() as session:
+        rows = session.scalars(select(Kabis).where(Kabis.id.in_(kabis_ids))).all()
+        todo = [row for row in rows if not row.file_is_index and row.download_url]
+        outcomes["skipped"] += len(kabis_ids) - len(todo)
+
+        paths = [Path(settings.UPLOAD_DIR) / Path(row.download_url).name for row in todo]
+        results = download_files([(f"{KABIS_URL}{row.download_url}", path) for row, path in zip(todo, paths)])
+        for row, path, result in zip(todo, paths, results):
+            try:
+                outcomes[queue_kabis_book(session, batch_id, row, path, result)] += 1
+            except Exception as e:
+                # одна книга не повторяет всю пачку: уже поставленные получили бы вторую job
+                session.rollback()
+                print(f"[ERROR] KABIS {row.id}: {e}")
+                outcomes["failed"] += 1
+    return outcomes
+
+
+@dramatiq.actor(max_retries=3, min_backoff=30000, queue_name=QUEUE_FILES, priority=10, time_limit=3600 * 1000)
+def crawl_kabis_books(batch_id: str, kabis_ids: list[str]):
+    if crawl_is_canceled(batch_id):
+        crawl_incr(batch_id, "skipped", len(kabis_ids))
+        return
+    for outcome, n in process_kabis_books(batch_id, kabis_ids).items():
+        crawl_incr(batch_id, outcome, n)
+
+
+@dramatiq.actor(max_retries=3, min_backoff=30000, queue_name=QUEUE_FILES, priority=10)
+def crawl_kabis_book(batch_id: str, kabis_id: str):
+    """Сообщения по одной книге, поставленные до перехода на пачки."""
+    crawl_kabis_books(batch_id, [kabis_id])
+
+
+def create_kabis_crawl(batch_id: str) -> int:
+    """
+    Обход файлов KABIS: строки с файлом, ещё не проиндексированные, читаются
+    страницами (keyset по id), на каждые DOWNLOAD_CONCURRENCY книг — сообщение crawl_kabis_books.
+    Отмена (status=canceled в сводке обхода) останавливает постановку.
+    """
+    db = SessionLocal()
+    try:
+        last_id = ""
+        total = 0
+        while not crawl_is_canceled(batch_id):
+            ids = db.scalars(
+                select(Kabis.id)
+                .where(Kabis.file_is_index.is_not(True), Kabis.download_url.isnot(None), Kabis.id > last_id)
+                .order_by(Kabis.id)
+                .limit(settings.JOB_INSERT_BATCH_SIZE)
+            ).all()
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            step = settings.DOWNLOAD_CONCURRENCY
+            for i in range(0, len(ids), step):
+                crawl_kabis_books.send(batch_id, list(ids[i:i + step]))
+            crawl_incr(batch_id, "enqueued", len(ids))
+            total += len(ids)
+
+        # всё поставлено, дальше — счётчики книг и job; отмену, пришедшую сейчас, не перетираем
+        crawl_set_status(batch_id, "running")
+        return total
+    finally:
+        db.close()
+
+
+@dramatiq.actor(max_retries=0, queue_name=QUEUE_FILES, priority=0, time_limit=3600 * 1000)
+def enqueue_kabis_crawl(batch_id: str):
+    create_kabis_crawl(batch_id)
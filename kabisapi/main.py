@@ -1,7 +1,10 @@
 import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from kabisapi.read_kabis import parse_payload, flatten_copies
 API = "http://89.250.88.12:8000"
-from typing import Optional, Mapping, Any
+from typing import Optional, Mapping, Any, Iterator
 
 
 def get_token(username: str, password: str) -> str:
@@ -26,6 +29,58 @@ def api_get(path: str, token: str, params: Optional[Mapping[str, Any]] = None):
     r.raise_for_status()
     return r
 
+def api_session(token: str, pool_size: int = 4) -> requests.Session:
+    """Session с keep-alive (пул соединений) и gzip — для постраничной выгрузки каталога."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {token}",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+
+def get_books_page(session: requests.Session, start_pos: int, end_pos: int, timeout: int = 300) -> dict:
+    r = session.get(f"{API}/get_books_range",
+                    params={"start_pos": start_pos, "end_pos": end_pos},
+                    timeout=(10, timeout))
+    r.raise_for_status()
+    return r.json()
+
+
+def iter_books_pages(token: str,
+                     start_pos: int,
+                     end_pos: int,
+                     page_size: int = 500,
+                     concurrency: int = 4) -> Iterator[tuple[int, int, dict]]:
+    """
+    Каталог страницами [start, end] по page_size карточек: до concurrency
+    запросов в полёте, страницы отдаются строго по порядку — вызывающий
+    может сохранять курсор после каждой.
+    """
+    pages = ((pos, min(pos + page_size - 1, end_pos)) for pos in range(start_pos, end_pos + 1, page_size))
+    with api_session(token, concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+
+        def submit_next() -> bool:
+            page = next(pages, None)
+            if page is None:
+                return False
+            pending.append((page, pool.submit(get_books_page, session, *page)))
+            return True
+
+        for _ in range(concurrency):
+            if not submit_next():
+                break
+        while pending:
+            (start, end), future = pending.popleft()
+            payload = future.result()
+            submit_next()
+            yield start, end, payload
+
+
 # token = get_token("admin", "admin123")
 # json_kabis_len = api_get("/count_books", token).json()
 # json_kabis = api_get("/get_books_range", token).json()
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 import re
 import html
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional, Tuple
 
 from bs4 import BeautifulSoup  # pip install beautifulsoup4
+import lxml.html               # pip install lxml
+from lxml import etree
 import pandas as pd            # pip install pandas openpyxl
 
 ISBN_RE = re.compile(r"ISBN\s+([0-9\-–—xX]+)")
@@ -76,6 +81,10 @@ def parse_author_title(bold_block: BeautifulSoup) -> Tuple[str, str]:
     # берём HTML внутри <b>, чтобы понять split по <br>
     parts = [clean_spaces(p) for p in bold_block.decode_contents().split("<br>")]
     parts = [clean_spaces(BeautifulSoup(p, "html.parser").get_text(" ", strip=True)) for p in parts]
+    return author_title_from_parts(parts)
+
+
+def author_title_from_parts(parts: List[str]) -> Tuple[str, str]:
     parts = [p for p in parts if p]
     if not parts:
         return "", ""
@@ -193,7 +202,8 @@ def parse_idbk(table: BeautifulSoup) -> Optional[int]:
     return None
 
 
-def parse_card_html(card_html: str) -> Dict[str, Any]:
+def parse_card_html_bs4(card_html: str) -> Dict[str, Any]:
+    """Эталонный разбор через BeautifulSoup (html.parser); parse_card_html падает сюда на «неудобных» карточках."""
     soup = BeautifulSoup(card_html, "html.parser")
     table = soup.find("table")
     if table is None:
@@ -285,22 +295,319 @@ def parse_card_html(card_html: str) -> Dict[str, Any]:
     }
 
 
-def parse_payload(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+# ---------------- быстрый разбор (lxml) ----------------
+# lxml строит дерево в разы быстрее BeautifulSoup и разбирает карточку один раз,
+# без повторного парсинга фрагментов. Но libxml2 «чинит» кривой HTML иначе, чем
+# html.parser (закрывает незакрытые <td>/<p>, переносит узлы), поэтому карточка
+# идёт быстрым путём, только если её дерево совпало с тем, что построил бы
+# BeautifulSoup; всё остальное — через parse_card_html_bs4. Результат одинаковый.
+
+# сущности, которые оба парсера декодируют одинаково; остальные '&' — в эталонный путь
+# (там clean_spaces/повторный парсинг раскрывают &amp;lt; и т.п. ещё раз)
+SAFE_ENTITY_RE = re.compile(r"&(?!(?:nbsp|quot|laquo|raquo|ndash|mdash|#160|#171|#187);)")
+TOKEN_RE = re.compile(
+    r"<!--(.*?)-->"
+    r"|<(/?)([a-zA-Z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.S,
+)
+VOID_TAGS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr",
+    "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid",
+    "param", "source", "spacer", "track", "wbr",
+}
+# содержимое как текст (script/style) или перенос в <head>/обёртку у libxml2 — в эталонный путь
+FALLBACK_TAGS = {"script", "style", "textarea", "title", "template", "html", "head", "body"}
+
+
+def html_parser_shape(card_html: str) -> Optional[List[Tuple[str, int]]]:
+    """
+    Форма дерева, которое построит BeautifulSoup(html.parser): [(тег или '#', глубина), ...]
+    в порядке документа ('#' — непустой текст). Правила те же: пустые элементы
+    закрываются сразу, <x/> — открыт и закрыт, </x> закрывает ближайший открытый x,
+    непарный </x> игнорируется. None — карточка, которую сравнивать не беремся.
+    """
+    shape: List[Tuple[str, int]] = []
+    stack: List[str] = []
+    pos = 0
+    for m in TOKEN_RE.finditer(card_html):
+        text = card_html[pos:m.start()]
+        pos = m.end()
+        if "<" in text:
+            return None                 # <!DOCTYPE, <?..., «a < b» — токенизаторы расходятся
+        if text.strip():
+            shape.append(("#", len(stack)))
+        comment, closing, name, attrs = m.groups()
+        if comment is not None:
+            if "<" in comment:
+                return None
+            continue
+        name = name.lower()
+        if name in FALLBACK_TAGS:
+            return None
+        if closing:
+            if name in VOID_TAGS:
+                return None             # </br>: BeautifulSoup и libxml2 трактуют по-разному
+            if name in stack:
+                while stack.pop() != name:
+                    pass
+            continue
+        shape.append((name, len(stack)))
+        if name not in VOID_TAGS and not attrs.rstrip().endswith("/"):
+            stack.append(name)
+    tail = card_html[pos:]
+    if "<" in tail:
+        return None
+    if tail.strip():
+        shape.append(("#", len(stack)))
+    return shape
+
+
+def _is_element(node) -> bool:
+    return isinstance(node.tag, str)    # у комментариев tag — функция
+
+
+def _lxml_shape(node, depth: int, shape: List[Tuple[str, int]]):
+    if _is_element(node):
+        shape.append((node.tag, depth))
+        if node.text and node.text.strip():
+            shape.append(("#", depth + 1))
+        for child in node:
+            _lxml_shape(child, depth + 1, shape)
+    if node.tail and node.tail.strip():
+        shape.append(("#", depth))
+
+
+def _strings(node):
+    """Текстовые узлы в порядке документа, без комментариев (как Tag.get_text в bs4)."""
+    if node.text:
+        yield node.text
+    for child in node:
+        if _is_element(child):
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _join_strings(strings) -> str:
+    return " ".join(s.strip() for s in strings if s.strip())
+
+
+def _text_of(node) -> str:
+    if node is None:
+        return ""
+    return html.unescape(re.sub(r"\s+", " ", _join_strings(_strings(node))).strip())
+
+
+def _classes(node) -> List[str]:
+    return (node.get("class") or "").split()
+
+
+def _find(node, tag: str, pred=None):
+    for el in node.iterdescendants(tag):
+        if pred is None or pred(el):
+            return el
+    return None
+
+
+def _pub_info_text(ab) -> str:
+    """То же, что склейка str(sib) после <b> и повторный разбор в parse_card_html_bs4."""
+    segments = []
+    current = ab.tail or ""
+    for sib in ab.itersiblings():
+        if not _is_element(sib):
+            current += (sib.text or "") + (sib.tail or "")  # str(Comment) — голый текст
+            continue
+        if sib.tag == "div" and "10pt" in _classes(sib):
+            break
+        if sib.tag == "p" and "bak" in _classes(sib):
+            break
+        segments.append(current)
+        segments.extend(_strings(sib))
+        current = sib.tail or ""
+    segments.append(current)
+    return clean_spaces(_join_strings(segments))
+
+
+def _author_title(b) -> Tuple[str, str]:
+    # decode_contents() отдаёт <br/>, поэтому split("<br>") в parse_author_title
+    # всегда даёт одну часть — весь текст <b>
+    return author_title_from_parts([clean_spaces(_join_strings(_strings(b)))])
+
+
+def _parse_card_lxml(card_html: str) -> Optional[Dict[str, Any]]:
+    """Разбор карточки через lxml; None — дерево расходится с html.parser, нужен эталонный путь."""
+    if SAFE_ENTITY_RE.search(card_html):
+        return None
+    shape = html_parser_shape(card_html)
+    if shape is None:
+        return None
+    try:
+        doc = lxml.html.document_fromstring(card_html)
+    except (etree.ParserError, ValueError):
+        return None
+    head = doc.find("head")
+    body = doc.find("body")
+    if body is None or (head is not None and (len(head) or (head.text or "").strip())):
+        return None
+    lxml_shape: List[Tuple[str, int]] = []
+    if body.text and body.text.strip():
+        lxml_shape.append(("#", 0))
+    for child in body:
+        _lxml_shape(child, 0, lxml_shape)
+    if lxml_shape != shape:
+        return None
+
+    table = _find(body, "table")
+    if table is None:
+        return {}
+
+    # --- шапка: номер, ББК, отдел/язык (parse_header_info) ---
+    pos_number = None
+    td_num = _find(table, "td", lambda td: "num" in _classes(td))
+    if td_num is not None:
+        try:
+            pos_number = int(_text_of(td_num).split()[0])
+        except Exception:
+            pass
+    first_b = _find(table, "b")
+    bbk_top = clean_spaces("".join(_strings(first_b))) if first_b is not None else ""
+    dept_code, lang = "", ""
+    right = _find(table, "td", lambda td: td.get("align") == "right")
+    if right is not None:
+        parts = _text_of(right).split()
+        if parts:
+            dept_code = parts[0]
+            if len(parts) > 1:
+                lang = parts[-1]
+
+    # --- сигла ---
+    sigla = ""
+    narrow_td = _find(table, "td", lambda td: "nowrap" in td.attrib)
+    if narrow_td is not None:
+        b = _find(narrow_td, "b")
+        if b is not None:
+            sigla = clean_spaces("".join(_strings(b)))
+
+    # --- автор/заглавие и выходные данные ---
+    cols2 = [td for td in table.iterdescendants("td") if "colspan" in td.attrib]
+    author, title = "", ""
+    pub_info_text = ""
+    if len(cols2) >= 2:
+        ab = _find(cols2[1], "b")
+        if ab is not None:
+            author, title = _author_title(ab)
+            pub_info_text = _pub_info_text(ab)
+    else:
+        for b in table.iterdescendants("b"):
+            if any(_is_element(d) and d.tag.startswith("br") for d in b.iterdescendants()):
+                author, title = _author_title(b)
+                pub_info_text = _pub_info_text(b)
+                break
+
+    pub = parse_pub_info(pub_info_text)
+    copies_div = _find(table, "div", lambda d: " ".join(_classes(d)) == "10pt")
+    if copies_div is None:
+        copies_div = _find(table, "div", lambda d: "10pt" in _classes(d))
+    full_text = _text_of(table)
+    subjects_text = full_text.replace(_text_of(copies_div), "") if copies_div is not None else full_text
+
+    m_idx = re.search(r"\b1\.\s", subjects_text)
+    subjects = parse_subjects(subjects_text[m_idx.start():]) if m_idx else []
+
+    copies: List[Dict[str, Any]] = []
+    if copies_div is not None:
+        for nobr in copies_div.iterdescendants("nobr"):
+            t = _text_of(nobr).lstrip("*").strip()
+            if "," in t:
+                location, tail = t.split(",", 1)
+                m = COUNT_RE.search(tail)
+                copies.append({"location": clean_spaces(location), "count": int(m.group(1)) if m else None})
+            elif t:
+                copies.append({"location": t, "count": None})
+
+    dl_url, open_url = None, None
+    desc = _find(table, "div", lambda d: "desc79" in _classes(d))
+    if desc is not None:
+        for a in desc.iterdescendants("a"):
+            link_title = (a.get("title") or "").lower()
+            if "скачать" in link_title:
+                dl_url = a.get("href")
+            elif "открыть" in link_title:
+                open_url = a.get("href")
+
+    idbk = None
+    inp = _find(table, "input", lambda i: i.get("name") == "IDBk")
+    if inp is not None and "value" in inp.attrib:
+        try:
+            idbk = int(inp.get("value"))
+        except Exception:
+            idbk = None
+
+    return {
+        "pos": pos_number,
+        "idbk": idbk,
+        "bbk_top": bbk_top,
+        "bbk_tail": _text_of(_find(table, "p", lambda p: "bak" in _classes(p))),
+        "dept_code": dept_code,
+        "lang": lang,
+        "sigla": sigla,
+        "author": author,
+        "title": title,
+        "pub_info": pub["pub_info"],
+        "year": pub["year"],
+        "isbn": pub["isbn"],
+        "subjects": "; ".join(subjects) if subjects else "",
+        "copies": copies,
+        "download_url": dl_url,
+        "open_url": open_url,
+    }
+
+
+def parse_card_html(card_html: str) -> Dict[str, Any]:
+    row = _parse_card_lxml(card_html)
+    return parse_card_html_bs4(card_html) if row is None else row
+
+
+def parse_item(it: Dict[str, Any]) -> Dict[str, Any]:
+    row = parse_card_html(it.get("card", ""))
+    # если pos из HTML не распарсился — возьмём из обёртки
+    if "pos" not in row or row["pos"] is None:
+        row["pos"] = it.get("pos")
+    return row
+
+
+PARALLEL_MIN_CARDS = 200   # меньше — пул процессов дороже самого разбора
+PARSE_CHUNKSIZE = 50       # карточек на одну передачу в процесс пула
+
+
+def parse_pool(workers: int):
+    """
+    Пул процессов для parse_payload (spawn — вызывается из веб-сервера с потоками);
+    при workers <= 1 — пустой контекст, разбор идёт в текущем процессе.
+    """
+    if workers <= 1:
+        return nullcontext(None)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def parse_payload(payload: Dict[str, Any],
+                  workers: int = 0,
+                  executor: Optional[ProcessPoolExecutor] = None) -> List[Dict[str, Any]]:
     """
     Принимает твой JSON вида:
     {'Books': {'dbid': 'BOOKS', 'normalized_query': 'AllBooks', 'total': 13401, 'range': [{'pos': 1, 'card': '<table ...'}, ...]}}
     Возвращает список записей (словарей) по каждой карточке.
+    Большие выгрузки можно разбирать в executor (см. parse_pool) или в workers процессах.
     """
     items = payload.get("Books", {}).get("range", [])
-    rows: List[Dict[str, Any]] = []
-    for it in items:
-        card_html = it.get("card", "")
-        row = parse_card_html(card_html)
-        # если pos из HTML не распарсился — возьмём из обёртки
-        if "pos" not in row or row["pos"] is None:
-            row["pos"] = it.get("pos")
-        rows.append(row)
-    return rows
+    if len(items) < PARALLEL_MIN_CARDS:
+        return [parse_item(it) for it in items]
+    if executor is not None:
+        return list(executor.map(parse_item, items, chunksize=PARSE_CHUNKSIZE))
+    if workers > 1:
+        with parse_pool(workers) as pool:
+            return list(pool.map(parse_item, items, chunksize=PARSE_CHUNKSIZE))
+    return [parse_item(it) for it in items]
 
 
 def flatten_copies(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -0,0 +1,20 @@
+# tests/conftest.py
+# app.core.config требует секреты из .env; для тестов без .env — заглушки,
+# чтобы модули app импортировались (к сервисам тесты не ходят).
+import os
+
+REQUIRED_SETTINGS = (
+    "GROQ_API_KEY", "OPENAI_SECRET_KEY", "SECRET_KEY_AUTH", "TESSERACT_CMD",
+    "DB_NAME", "DB_USERNAME", "DB_PASSWORD", "DB_HOST",
+    "KABIS_USERNAME", "KABIS_PASSWORD",
+    "LIB_TAU_USER", "LIB_TAU_PASSWORD", "LIB_TAU_HOST",
+    "SSH_SERVER_PLATONUS_HOST", "SSH_SERVER_PLATONUS_USER", "SSH_SERVER_PLATONUS_PASSWORD",
+    "PLATONUS_DB_HOST", "PLATONUS_DB_USER", "PLATONUS_DB_PASSWORD", "PLATONUS_DB_NAME",
+)
+REQUIRED_PORTS = ("REDIS_PORT", "DB_PORT", "LIB_TAU_PORT", "SSH_SERVER_PLATONUS_PORT", "PLATONUS_DB_PORT")
+
+for name in REQUIRED_SETTINGS:
+    os.environ.setdefault(name, "test")
+for name in REQUIRED_PORTS:
+    os.environ.setdefault(name, "1")
+os.environ.setdefault("REDIS_URL", "localhost")
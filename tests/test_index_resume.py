@@ -0,0 +1,93 @@
+# tests/test_index_resume.py
+# Ретрай с чекпоинта (PageChunker.state) обязан дать те же id точек,
+# что и индексация книги без перерыва: иначе в Qdrant остаются лишние векторы.
+import json
+
+import pytest
+from langchain_core.documents import Document
+
+from app.core import chunking, vectorstore
+from app.core.config import settings
+
+
+class WordEncoding:
+    """Токен — слово: тесту важны границы чанков, а не словарь модели."""
+
+    def encode_ordinary(self, text: str) -> list[str]:
+        return text.split()
+
+    def encode_ordinary_batch(self, texts: list[str]) -> list[list[str]]:
+        return [t.split() for t in texts]
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(chunking, "token_encoding", lambda model=None: WordEncoding())
+    monkeypatch.setattr(settings, "CHUNK_TOKENS", 40)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 12)
+    monkeypatch.setattr(settings, "INDEX_PAGE_WINDOW", 3)
+
+
+def book_pages(n: int = 20) -> list[Document]:
+    pages = []
+    for page in range(n):
+        paragraphs = [
+            " ".join(f"p{page}w{j}s{k}" for k in range(7 + (page + j) % 9))
+            for j in range(1 + page % 4)
+        ]
+        pages.append(Document(page_content="\n\n".join(paragraphs), metadata={"doc_id": "book-1", "page": page}))
+    return pages
+
+
+def recorder(point_ids: set, crash_on_call: int | None = None):
+    calls = 0
+
+    def write_book_chunks(chunks, collection_name):
+        nonlocal calls
+        calls += 1
+        for i, chunk in enumerate(chunks):
+            if calls == crash_on_call and i == len(chunks) // 2:
+                raise Crash()  # окно записано наполовину
+            point_ids.add(vectorstore.chunk_point_id(chunk))
+        return len(chunks)
+    return write_book_chunks
+
+
+def test_resume_from_checkpoint_writes_same_point_ids(monkeypatch):
+    pages = book_pages()
+
+    uninterrupted = set()
+    monkeypatch.setattr(vectorstore, "write_book_chunks", recorder(uninterrupted))
+    vectorstore.index_document_stream(pages, collection_name="books")
+
+    resumed = set()
+    checkpoints = []
+    monkeypatch.setattr(vectorstore, "write_book_chunks", recorder(resumed, crash_on_call=4))
+    with pytest.raises(Crash):
+        vectorstore.index_document_stream(pages, collection_name="books", on_checkpoint=checkpoints.append)
+
+    # чекпоинт пережил Redis (JSON) и продолжение начинается с середины книги, с непустым буфером
+    state = json.loads(json.dumps(checkpoints[-1]))
+    assert 0 < state["seq"] < len(pages)
+    assert state["buffer"]
+
+    monkeypatch.setattr(vectorstore, "write_book_chunks", recorder(resumed))
+    vectorstore.index_document_stream(pages[state["seq"]:], collection_name="books", resume_state=state)
+
+    assert resumed == uninterrupted
+
+
+def test_chunker_state_round_trip_matches_single_pass():
+    pages = book_pages()
+    single = chunking.chunk_pages(pages)
+
+    first = chunking.PageChunker()
+    chunks = first.feed(pages[:7])
+    second = chunking.PageChunker.from_state(json.loads(json.dumps(first.state())))
+    chunks += second.feed(pages[7:]) + second.finish()
+
+    assert [(c.page_content, c.metadata) for c in chunks] == [(c.page_content, c.metadata) for c in single]
@@ -0,0 +1,94 @@
+# tests/test_near_dedup.py
+# MinHash + LSH почти-дубликатов: подписи, полосы и порог NEAR_DUP_THRESHOLD.
+# Индекс подписей — SQLite в памяти вместо Postgres (поиск кандидатов — обычный select).
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.near_dedup import band_hashes, find_near_duplicates, minhash_signature, similarity
+from app.models.chunk_signature import ChunkSignature, ChunkSignatureBand
+
+VOCABULARY = [f"слово{i}" for i in range(5000)]
+
+
+def random_text(seed: int, n_words: int = 200) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(n_words)]
+
+
+def edited(words: list[str], every: int) -> str:
+    """Каждое every-е слово заменено: чем чаще правки, тем ниже Жаккар по 5-шинглам."""
+    return " ".join("правка" if i % every == every // 2 else w for i, w in enumerate(words))
+
+
+BOOK = random_text(1)
+TEXT = " ".join(BOOK)
+REPRINT = edited(BOOK, 200)     # одно слово из 200: Жаккар ≈ 0.95
+REVISED = edited(BOOK, 30)      # семь слов: Жаккар ≈ 0.75 — кандидат по полосам, но ниже порога
+UNRELATED = " ".join(random_text(2))
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    tables = [ChunkSignature.__table__, ChunkSignatureBand.__table__]
+    ChunkSignature.metadata.create_all(engine, tables=tables)
+    with Session(engine) as s:
+        yield s
+
+
+def add_to_index(session: Session, collection: str, point_id: str, owner: str, text: str):
+    sig = minhash_signature(text)
+    session.add(ChunkSignature(collection=collection, point_id=point_id, owner=owner, signature=sig.tobytes()))
+    for band, band_hash in enumerate(band_hashes(sig)):
+        session.add(ChunkSignatureBand(collection=collection, band=band, band_hash=band_hash, point_id=point_id))
+    session.commit()
+
+
+def test_short_text_is_not_compared():
+    assert minhash_signature("короткий заголовок главы") is None
+
+
+def test_signature_and_bands_are_deterministic():
+    sig = minhash_signature(TEXT)
+    assert len(sig) == settings.MINHASH_PERMUTATIONS
+    assert (sig == minhash_signature(TEXT)).all()
+    assert len(band_hashes(sig)) == settings.LSH_BANDS
+    assert band_hashes(sig) == band_hashes(minhash_signature(TEXT))
+
+
+def test_similarity_estimates_jaccard():
+    sig = minhash_signature(TEXT)
+    assert similarity(sig, minhash_signature(REPRINT)) >= settings.NEAR_DUP_THRESHOLD
+    revised = minhash_signature(REVISED)
+    assert set(enumerate(band_hashes(sig))) & set(enumerate(band_hashes(revised)))
+    assert similarity(sig, revised) < settings.NEAR_DUP_THRESHOLD
+    assert similarity(sig, minhash_signature(UNRELATED)) < 0.1
+    # непохожий текст не попадает в кандидаты ни по одной полосе
+    assert not set(enumerate(band_hashes(sig))) & set(enumerate(band_hashes(minhash_signature(UNRELATED))))
+
+
+def test_find_near_duplicates_applies_threshold_and_owner(session):
+    add_to_index(session, "books_v1", "canonical", "book-a", TEXT)
+    items = [
+        ("p1", "book-b", REPRINT),     # переиздание другой книги → ссылка на канонический чанк
+        ("p2", "book-a", REPRINT),     # та же книга — не дубликат
+        ("p3", "book-b", REVISED),     # кандидат по полосе, отсеян порогом
+        ("p4", "book-b", UNRELATED),
+        ("p5", "book-b", "мало слов"),
+    ]
+    signatures, matches = find_near_duplicates(session, "books_v1", items)
+
+    assert set(matches) == {0}
+    canonical_id, score = matches[0]
+    assert canonical_id == "canonical" and score >= settings.NEAR_DUP_THRESHOLD
+    assert signatures[4] is None
+
+
+def test_find_near_duplicates_is_scoped_to_collection(session):
+    add_to_index(session, "books_v1", "canonical", "book-a", TEXT)
+    _, matches = find_near_duplicates(session, "books_v2", [("p1", "book-b", REPRINT)])
+    assert matches == {}
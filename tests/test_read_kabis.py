@@ -0,0 +1,61 @@
+# tests/test_read_kabis.py
+# Быстрый разбор карточек KABIS (lxml) обязан давать те же строки, что исходный
+# parse_card_html_bs4. Эталон: tests/fixtures/kabis_books_range*.json
+# (обновление — python -m tests.update_kabis_golden).
+import json
+
+import pytest
+
+from kabisapi import read_kabis
+from kabisapi.read_kabis import _parse_card_lxml, parse_card_html, parse_card_html_bs4, parse_payload, parse_pool
+from tests.update_kabis_golden import CARDS_PATH, EXPECTED_PATH, reference_rows
+
+
+@pytest.fixture(scope="module")
+def payload() -> dict:
+    return json.loads(CARDS_PATH.read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="module")
+def expected() -> list[dict]:
+    return json.loads(EXPECTED_PATH.read_text(encoding="utf-8"))
+
+
+def test_golden_file_is_current(payload, expected):
+    assert reference_rows(payload) == expected
+
+
+def test_parse_payload_matches_golden(payload, expected):
+    assert parse_payload(payload) == expected
+
+
+def test_parse_payload_in_process_pool_matches_golden(payload, expected, monkeypatch):
+    # в фикстуре меньше PARALLEL_MIN_CARDS карточек — иначе пул не включится
+    monkeypatch.setattr(read_kabis, "PARALLEL_MIN_CARDS", 0)
+    assert parse_payload(payload, workers=2) == expected
+    with parse_pool(2) as pool:
+        assert parse_payload(payload, executor=pool) == expected
+
+
+def test_each_card_matches_bs4(payload):
+    for it in payload["Books"]["range"]:
+        assert parse_card_html(it["card"]) == parse_card_html_bs4(it["card"]), it["pos"]
+
+
+def test_fast_path_is_used(payload):
+    # обычные карточки идут через lxml, а не молча через BeautifulSoup
+    cards = [it["card"] for it in payload["Books"]["range"]]
+    fast = [c for c in cards if _parse_card_lxml(c) is not None]
+    assert len(fast) >= len(cards) // 2
+
+
+@pytest.mark.parametrize("card", [
+    "<table><tr><td class=num>1.<td colspan=2><b>12.3</b></tr></table>",          # незакрытые <td>
+    "<table><tr><td><p class=bak>ББК<div class=10pt>x</div></p></td></tr></table>",  # <div> внутри <p>
+    "<table><tr><td><b>A &amp;lt; B</b></td></tr></table>",                        # двойное раскрытие сущностей
+    "<table><tr><td><a href=/x/>Скачать</a></td></tr></table>",
+    "<table><tr><td>x</br>y</td></tr></table>",
+])
+def test_diverging_trees_fall_back_to_bs4(card):
+    assert _parse_card_lxml(card) is None
+    assert parse_card_html(card) == parse_card_html_bs4(card)
@@ -0,0 +1,44 @@
+# tests/update_kabis_golden.py
+# Эталон для tests/test_read_kabis.py: карточки /get_books_range и строки,
+# которые из них строит parse_card_html_bs4 (исходный разбор через BeautifulSoup).
+#
+#   python -m tests.update_kabis_golden                  # пересчитать expected по текущим карточкам
+#   python -m tests.update_kabis_golden 1 200            # выгрузить карточки 1..200 из KABIS
+#                                                        # (KABIS_USERNAME / KABIS_PASSWORD из окружения)
+import json
+import os
+import sys
+from pathlib import Path
+
+from kabisapi.read_kabis import parse_card_html_bs4
+
+FIXTURES = Path(__file__).parent / "fixtures"
+CARDS_PATH = FIXTURES / "kabis_books_range.json"
+EXPECTED_PATH = FIXTURES / "kabis_books_range.expected.json"
+
+
+def reference_rows(payload: dict) -> list[dict]:
+    rows = []
+    for it in payload.get("Books", {}).get("range", []):
+        row = parse_card_html_bs4(it.get("card", ""))
+        if "pos" not in row or row["pos"] is None:
+            row["pos"] = it.get("pos")
+        rows.append(row)
+    return rows
+
+
+def fetch_cards(start_pos: int, end_pos: int) -> dict:
+    from kabisapi.main import api_get, get_token
+
+    token = get_token(os.environ["KABIS_USERNAME"], os.environ["KABIS_PASSWORD"])
+    return api_get("/get_books_range", token, params={"start_pos": start_pos, "end_pos": end_pos}).json()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        payload = fetch_cards(int(sys.argv[1]), int(sys.argv[2]))
+        CARDS_PATH.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+    payload = json.loads(CARDS_PATH.read_text(encoding="utf-8"))
+    rows = reference_rows(payload)
+    EXPECTED_PATH.write_text(json.dumps(rows, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"[INFO] {EXPECTED_PATH.name}: {len(rows)} карточек")